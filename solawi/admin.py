@@ -1,5 +1,48 @@
-from django.contrib import admin
-from .models import Depot, Product, User, WeeklyBasket, Portion, OrderBasket
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.auth.models import Permission
+from django.db.models import F, FloatField, Prefetch, Sum
+from django.template.response import TemplateResponse
+from django.utils.translation import ugettext_lazy as _
+from .assignments import assign_members
+from .forms import AssignMembersForm, OrderBasketAdminForm
+from .models import (
+    AccountEntry,
+    ClosedWeek,
+    Depot,
+    OrderBasket,
+    OrderBasketProduct,
+    OutboxMail,
+    Portion,
+    Product,
+    StandingOrder,
+    User,
+    WeeklyBasket,
+)
+from .projection import project_balances
+from . import utils
+
+
+def portions_with_food():
+    '''
+    The portions with their product, as every str(portion) needs it.
+    '''
+    return Portion.objects.select_related('food')
+
+
+def basket_closed(basket):
+    '''
+    If the order basket belongs to a week whose orders are closed. The
+    week view takes no changes any more, so the admin does not either.
+
+    Args:
+      basket: An OrderBasket or None for a new one.
+
+    Returns:
+
+    '''
+    return basket is not None and utils.orders_closed(basket.week)
 
 
 class PortionInline(admin.TabularInline):
@@ -7,6 +50,87 @@ class PortionInline(admin.TabularInline):
     model = Portion
     extra = 1
 
+    def get_queryset(self, request):
+        ''' '''
+        return super().get_queryset(request).select_related('food')
+
+
+class AccountEntryInline(admin.TabularInline):
+    ''' '''
+    model = AccountEntry
+    extra = 1
+
+
+class OrderBasketProductInline(admin.TabularInline):
+    ''' '''
+    model = OrderBasketProduct
+    extra = 1
+
+    def get_queryset(self, request):
+        ''' '''
+        return super().get_queryset(request).select_related(
+            'portion__food', 'basket__user__depot')
+
+    def get_readonly_fields(self, request, obj=None):
+        ''' '''
+        if basket_closed(obj):
+            return ['portion', 'count', 'price']
+        return super().get_readonly_fields(request, obj)
+
+    def get_max_num(self, request, obj=None, **kwargs):
+        ''' '''
+        if basket_closed(obj):
+            return 0
+        return super().get_max_num(request, obj, **kwargs)
+
+    def has_delete_permission(self, request, obj=None):
+        ''' '''
+        if basket_closed(obj):
+            return False
+        return super().has_delete_permission(request, obj)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        '''
+        The portion choices are evaluated once per request and shared by
+        the select widgets of all rows.
+        '''
+        if db_field.name != 'portion':
+            return super().formfield_for_foreignkey(db_field, request,
+                                                    **kwargs)
+        kwargs['queryset'] = portions_with_food()
+        formfield = super().formfield_for_foreignkey(db_field, request,
+                                                     **kwargs)
+        if not hasattr(request, '_portion_choices'):
+            request._portion_choices = list(formfield.choices)
+        formfield.choices = request._portion_choices
+        return formfield
+
+
+class OrderBasketChangeList(ChangeList):
+    '''
+    Adds the number of items and the total price to the baskets of the
+    current page with one grouped query. Annotating the queryset instead
+    would aggregate the whole table for the count of the paginator.
+    '''
+
+    def get_results(self, request):
+        ''' '''
+        super().get_results(request)
+        baskets = list(self.result_list)
+        totals = {
+            basket: (item_count, total_price)
+            for (basket, item_count, total_price)
+            in OrderBasketProduct.objects.filter(
+                basket__in=[basket.pk for basket in baskets]).order_by(
+                ).values_list('basket').annotate(
+                    item_count=Sum('count'),
+                    total_price=Sum(F('count') * F('price'),
+                                    output_field=FloatField()))}
+        for basket in baskets:
+            basket.item_count, basket.total_price = totals.get(basket.pk,
+                                                               (0, 0))
+        self.result_list = baskets
+
 
 class ProductAdmin(admin.ModelAdmin):
     ''' '''
@@ -20,17 +144,235 @@ class DepotAdmin(admin.ModelAdmin):
 
 class WeeklyBasketAdmin(admin.ModelAdmin):
     ''' '''
-    pass
+
+    def get_queryset(self, request):
+        ''' '''
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('contents', queryset=portions_with_food()))
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        ''' '''
+        if db_field.name == 'contents':
+            kwargs['queryset'] = portions_with_food()
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
+
+
+class UserChangeList(ChangeList):
+    '''
+    Adds the projected accounts to the users of the current page.
+    '''
+
+    def get_results(self, request):
+        ''' '''
+        super().get_results(request)
+        users = list(self.result_list)
+        projections = project_balances(User.objects.filter(
+            pk__in=[user.pk for user in users]))
+        for user in users:
+            user.projection = projections[user.pk]
+        self.result_list = users
 
 
 class UserAdmin(admin.ModelAdmin):
     ''' '''
-    pass
+    inlines = [AccountEntryInline]
+    readonly_fields = ['assets']
+    list_select_related = ['depot']
+    list_display = ['__str__', 'assets', 'expiring', 'overflow', 'per_week',
+                    'next_extra']
+    actions = ['assign_selected']
+    # How many rejected users are named in the summary of an assignment.
+    rejected_shown = 20
+
+    def get_changelist(self, request, **kwargs):
+        ''' '''
+        return UserChangeList
+
+    def expiring(self, obj):
+        ''' '''
+        return obj.projection.expiring
+    expiring.short_description = _('expiring this week')
+
+    def overflow(self, obj):
+        ''' '''
+        return round(obj.projection.overflow, 2)
+    overflow.short_description = _('above the cap')
+
+    def per_week(self, obj):
+        ''' '''
+        return round(obj.projection.weekly, 2)
+    per_week.short_description = _('per week')
+
+    def next_extra(self, obj):
+        ''' '''
+        return obj.projection.next_extra
+    next_extra.short_description = _('next extra')
+
+    def assign_selected(self, request, queryset):
+        '''
+        Ask for a depot, a weekly basket or the flags and assign them to the
+        selected users with bulk updates, see assignments.assign_members.
+        '''
+        users = list(queryset.values_list('pk', flat=True))
+        form = AssignMembersForm(
+            request.POST if 'apply' in request.POST else None)
+        if not form.is_valid():
+            return TemplateResponse(request, 'admin/assign_members.html', {
+                'title': _('Assign members'),
+                'opts': self.model._meta,
+                'form': form,
+                'users': users,
+                'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            })
+        updated, rejected = assign_members(
+            {user: form.changes() for user in users})
+        self.message_user(request, _('{count} users updated.').format(
+            count=updated))
+        if rejected:
+            self.message_user(request, self.rejected_summary(rejected),
+                              messages.WARNING)
+        return None
+    assign_selected.short_description = _(
+        'Assign a depot, weekly basket or flags')
+
+    def rejected_summary(self, rejected):
+        '''
+
+        Args:
+          rejected: A dict mapping the user ids to the reason.
+
+        Returns:
+          The message listing the rejected users.
+
+        '''
+        shown = sorted(rejected)[:self.rejected_shown]
+        names = dict(User.objects.filter(pk__in=shown).values_list(
+            'pk', 'username'))
+        summary = _('{count} users rejected: {users}').format(
+            count=len(rejected), users='; '.join(
+                '{name}: {reason}'.format(name=names.get(user, user),
+                                          reason=rejected[user])
+                for user in shown))
+        if len(rejected) > len(shown):
+            summary += ' ...'
+        return summary
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        ''' '''
+        if db_field.name == 'weeklybasket':
+            kwargs['queryset'] = WeeklyBasket.objects.prefetch_related(
+                Prefetch('contents', queryset=portions_with_food()))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        ''' '''
+        if db_field.name == 'user_permissions':
+            kwargs['queryset'] = Permission.objects.select_related(
+                'content_type')
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
 
 
 class OrderBasketAdmin(admin.ModelAdmin):
+    '''
+    The baskets of weeks whose orders are closed are read-only, like in the
+    week view. OrderBasketAdminForm rejects new baskets for those weeks.
+    '''
+    form = OrderBasketAdminForm
+    inlines = [OrderBasketProductInline]
+    raw_id_fields = ['user']
+    list_display = ['week', 'user', 'depot', 'item_count', 'total_price']
+    list_filter = ['week', 'edited_weekly_basket']
+
+    def get_queryset(self, request):
+        ''' '''
+        return super().get_queryset(request).select_related(
+            'user__depot').prefetch_related(
+                Prefetch('contents', queryset=portions_with_food()))
+
+    def get_changelist(self, request, **kwargs):
+        ''' '''
+        return OrderBasketChangeList
+
+    def get_readonly_fields(self, request, obj=None):
+        ''' '''
+        if basket_closed(obj):
+            return ['week', 'user', 'edited_weekly_basket']
+        return super().get_readonly_fields(request, obj)
+
+    def has_delete_permission(self, request, obj=None):
+        ''' '''
+        if basket_closed(obj):
+            return False
+        return super().has_delete_permission(request, obj)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        ''' '''
+        if db_field.name == 'user':
+            kwargs['queryset'] = User.objects.select_related('depot')
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def depot(self, obj):
+        ''' '''
+        if obj.user.depot is None:
+            return None
+        return obj.user.depot.name
+    depot.short_description = _('depot')
+    depot.admin_order_field = 'user__depot__name'
+
+    def item_count(self, obj):
+        ''' '''
+        return obj.item_count
+    item_count.short_description = _('items')
+
+    def total_price(self, obj):
+        ''' '''
+        return round(obj.total_price, 2)
+    total_price.short_description = _('total price')
+
+
+class ClosedWeekAdmin(admin.ModelAdmin):
+    '''
+    Deleting a closed week drops its snapshots and reopens it for
+    close_week.
+    '''
+    list_display = ['week', 'closed', 'mails_queued']
+    readonly_fields = ['week', 'closed', 'mails_queued']
+
+    def has_add_permission(self, request):
+        ''' '''
+        return False
+
+
+class StandingOrderAdmin(admin.ModelAdmin):
     ''' '''
-    pass
+    list_display = ['user', 'weeklybasket', 'kind', 'portion', 'replacement',
+                    'count', 'period', 'start', 'end']
+    list_filter = ['kind']
+    list_select_related = ['user__depot', 'weeklybasket', 'portion__food',
+                           'replacement__food']
+    raw_id_fields = ['user']
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        ''' '''
+        if db_field.name in ('portion', 'replacement'):
+            kwargs['queryset'] = portions_with_food()
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+class OutboxMailAdmin(admin.ModelAdmin):
+    '''
+    Resetting the attempts of a failed mail lets send_mails try it again.
+    '''
+    list_display = ['week', 'kind', 'recipient', 'sent', 'attempts']
+    list_filter = ['kind', 'week']
+    list_select_related = ['week']
+    readonly_fields = ['week', 'kind', 'user', 'recipient', 'subject', 'body',
+                       'attachment_name', 'attachment', 'created', 'sent',
+                       'error']
+
+    def has_add_permission(self, request):
+        ''' '''
+        return False
 
 
 admin.site.register(Product, ProductAdmin)
@@ -38,3 +380,6 @@ admin.site.register(Depot, DepotAdmin)
 admin.site.register(WeeklyBasket, WeeklyBasketAdmin)
 admin.site.register(User, UserAdmin)
 admin.site.register(OrderBasket, OrderBasketAdmin)
+admin.site.register(ClosedWeek, ClosedWeekAdmin)
+admin.site.register(OutboxMail, OutboxMailAdmin)
+admin.site.register(StandingOrder, StandingOrderAdmin)
@@ -0,0 +1,141 @@
+import datetime
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from solawi.models import (
+    ArchivedBasket,
+    ClosedWeek,
+    OrderBasket,
+    OrderBasketProduct,
+    Portion,
+    delete_without_signals,
+)
+from solawi import utils
+
+
+def archivable_weeks(weeks=None, date=None):
+    '''
+    The closed weeks older than the horizon which still have order baskets.
+    Weeks without a snapshot are left alone, as their pages and reports
+    still compute them from the order baskets.
+
+    Args:
+      weeks: The horizon in weeks. (Default value = None,
+        ARCHIVE_AFTER_WEEKS)
+      date: (Default value = None, today)
+
+    Returns:
+      A list of Mondays.
+
+    '''
+    if weeks is None:
+        weeks = settings.ARCHIVE_AFTER_WEEKS
+    horizon = utils.get_moday(date) - datetime.timedelta(7 * weeks)
+    return list(ClosedWeek.objects.filter(
+        week__lt=horizon,
+        week__in=OrderBasket.objects.filter(week__lt=horizon).values(
+            'week')).values_list('week', flat=True))
+
+
+def archive_week(week):
+    '''
+    Move the order baskets of a week into ArchivedBasket rows, one per
+    member with its line items packed, and delete them from the order
+    basket tables. The weekly totals of the week are kept, so the rows are
+    deleted without their signals.
+
+    Args:
+      week: A day of the week.
+
+    Returns:
+      The number of archived baskets.
+
+    '''
+    monday = utils.get_moday(week)
+    with transaction.atomic():
+        baskets = OrderBasket.objects.filter(week=monday)
+        # Takes the write lock on SQLite before anything is read, see
+        # OrderBasketQuerySet.lock.
+        baskets.update(edited_weekly_basket=F('edited_weekly_basket'))
+        lines = {}
+        for (user, portion, count, price) in \
+                OrderBasketProduct.objects.filter(
+                    basket__week=monday).order_by(
+                        'basket__user', 'portion').values_list(
+                            'basket__user', 'portion', 'count',
+                            'price').iterator():
+            lines.setdefault(user, []).append((portion, count, price))
+        archived = [
+            ArchivedBasket(week=monday, user_id=user,
+                           edited_weekly_basket=edited,
+                           lines=ArchivedBasket.pack(lines.get(user, [])))
+            for (user, edited) in baskets.values_list(
+                'user', 'edited_weekly_basket').iterator()]
+        ArchivedBasket.objects.bulk_create(archived, batch_size=500)
+
+        delete_without_signals(OrderBasketProduct.objects.filter(
+            basket__in=baskets))
+        delete_without_signals(baskets)
+    return len(archived)
+
+
+def restore_week(week):
+    '''
+    Move the archived baskets of a week back into the order basket tables,
+    e.g. before a closed week is reopened. The line items of portions
+    deleted since are dropped, as deleting a portion deletes its line
+    items.
+
+    Args:
+      week: A day of the week.
+
+    Returns:
+      The number of restored baskets.
+
+    '''
+    monday = utils.get_moday(week)
+    with transaction.atomic():
+        archived = ArchivedBasket.objects.filter(week=monday)
+        rows = list(archived.values_list('user', 'edited_weekly_basket',
+                                         'lines'))
+        if not rows:
+            return 0
+        OrderBasket.objects.bulk_create([
+            OrderBasket(week=monday, user_id=user, edited_weekly_basket=edited)
+            for (user, edited, data) in rows], batch_size=500)
+        # bulk_create does not set the ids on every database.
+        ids = dict(OrderBasket.objects.filter(week=monday).values_list(
+            'user', 'pk'))
+        portions = set(Portion.objects.values_list('pk', flat=True))
+        OrderBasketProduct.objects.bulk_create([
+            OrderBasketProduct(basket_id=ids[user], portion_id=portion,
+                               count=count, price=price)
+            for (user, edited, data) in rows
+            for (portion, count, price) in ArchivedBasket.unpack(data)
+            if portion in portions], batch_size=500)
+        archived.delete()
+    return len(rows)
+
+
+def archived_lines(first_week, last_week):
+    '''
+    The line items of the archived baskets between two weeks, in the order
+    of the weeks and the users.
+
+    Args:
+      first_week: A day of the first week.
+      last_week: A day of the last week.
+
+    Returns:
+      Yields (Monday, user id, edited_weekly_basket, portion id, count,
+      price) for every line item.
+
+    '''
+    for (monday, user, edited, data) in ArchivedBasket.objects.filter(
+            week__gte=utils.get_moday(first_week),
+            week__lte=utils.get_moday(last_week)).order_by(
+                'week', 'user').values_list(
+                    'week', 'user', 'edited_weekly_basket',
+                    'lines').iterator():
+        for (portion, count, price) in ArchivedBasket.unpack(data):
+            yield monday, user, edited, portion, count, price
@@ -0,0 +1,101 @@
+from django.db import transaction
+from django.utils.translation import ugettext_lazy as _
+from solawi.models import (
+    Depot,
+    OrderBasketProduct,
+    User,
+    WeeklyBasket,
+    member_assignment_error,
+    move_weekly_totals,
+)
+from solawi import caching
+
+FIELDS = ['depot', 'weeklybasket', 'is_member', 'is_supervisor']
+
+
+def assign_members(assignments, batch_size=500):
+    '''
+    Assign depots, weekly baskets and the member and supervisor flags to
+    many users at once, e.g. when the members are reshuffled for a new
+    season. The current values of all users are read first and every
+    assignment is checked against the invariants of User.clean. The valid
+    ones are written with one UPDATE per batch of users getting the same
+    values, without User.save. Members moving to another depot take their
+    line items along in the weekly totals, as member_saved does for a
+    single save.
+
+    Args:
+      assignments: A dict mapping the user ids to a dict of the new values
+        of some of the FIELDS, with the ids of the depot and weekly basket.
+      batch_size: Users per query. (Default value = 500)
+
+    Returns:
+      A tuple of the number of updated users and a dict mapping the ids of
+      the rejected users to the reason.
+
+    '''
+    for changes in assignments.values():
+        unknown = set(changes) - set(FIELDS)
+        if unknown:
+            raise ValueError('{fields} can not be assigned.'.format(
+                fields=', '.join(sorted(unknown))))
+    depots = {changes['depot'] for changes in assignments.values()
+              if changes.get('depot') is not None}
+    depots = set(Depot.objects.filter(pk__in=depots).values_list(
+        'pk', flat=True))
+    baskets = {changes['weeklybasket'] for changes in assignments.values()
+               if changes.get('weeklybasket') is not None}
+    baskets = set(WeeklyBasket.objects.filter(pk__in=baskets).values_list(
+        'pk', flat=True))
+
+    rejected = {}
+    with transaction.atomic():
+        current = {}
+        user_ids = list(assignments)
+        for i in range(0, len(user_ids), batch_size):
+            for (pk, *values) in User.objects.filter(
+                    pk__in=user_ids[i:i + batch_size]).values_list(
+                        'pk', *FIELDS):
+                current[pk] = dict(zip(FIELDS, values))
+
+        groups = {}
+        for user, changes in assignments.items():
+            if user not in current:
+                rejected[user] = _('There is no such user.')
+                continue
+            if changes.get('depot') not in depots | {None}:
+                rejected[user] = _('There is no such depot.')
+                continue
+            if changes.get('weeklybasket') not in baskets | {None}:
+                rejected[user] = _('There is no such weekly basket.')
+                continue
+            values = dict(current[user], **changes)
+            error = member_assignment_error(*[values[field]
+                                              for field in FIELDS])
+            if error is not None:
+                rejected[user] = error
+                continue
+            changed = tuple(sorted((field, value)
+                                   for field, value in changes.items()
+                                   if current[user][field] != value))
+            if changed:
+                groups.setdefault(changed, []).append(user)
+
+        updated = 0
+        for changed, users in groups.items():
+            changed = dict(changed)
+            for i in range(0, len(users), batch_size):
+                batch = users[i:i + batch_size]
+                if 'depot' in changed:
+                    move_weekly_totals(
+                        OrderBasketProduct.objects.filter(
+                            basket__user__in=batch),
+                        old_key=lambda week, depot: (week, depot),
+                        new_key=lambda week, depot: (week, changed['depot']))
+                updated += User.objects.filter(pk__in=batch).update(
+                    **changed)
+        if updated:
+            caching.bump('members')
+            caching.bump('weeklybaskets')
+            caching.bump('totals')
+    return updated, rejected
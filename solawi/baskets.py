@@ -0,0 +1,152 @@
+from collections import Counter, OrderedDict
+
+
+class BasketDiff(object):
+    '''
+    The multiset difference between the weekly basket of a member and its
+    order basket of a week, computed in one pass over Counters of portion
+    ids.
+
+    Attributes:
+      portions: A dict mapping the portion ids to the portions.
+      weekly: Counter of the portions in the weekly basket.
+      ordered: Counter of the line items of the order basket.
+      kept: Counter of the weekly basket portions the member still gets.
+      removed: Counter of the weekly basket portions the member deselected.
+      added: Counter of the portions ordered on top of the weekly basket.
+    '''
+
+    def __init__(self, weekly, ordered, edited):
+        '''
+
+        Args:
+          weekly: Iterable of the portions of the weekly basket.
+          ordered: Iterable of (portion, count) of the order basket.
+          edited: If the weekly basket was edited in the order basket. If
+            not, the order basket only holds additional portions.
+
+        '''
+        self.portions = OrderedDict()
+        self.weekly = Counter()
+        self.ordered = Counter()
+        for portion in weekly:
+            self.portions.setdefault(portion.pk, portion)
+            self.weekly[portion.pk] += 1
+        for portion, count in ordered:
+            self.portions.setdefault(portion.pk, portion)
+            self.ordered[portion.pk] += count
+
+        self.kept = Counter()
+        self.removed = Counter()
+        self.added = Counter()
+        for pk in self.portions:
+            weekly_count = self.weekly[pk]
+            ordered_count = self.ordered[pk]
+            if edited:
+                kept = min(weekly_count, ordered_count)
+            else:
+                kept = weekly_count
+                ordered_count += weekly_count
+            if kept:
+                self.kept[pk] = kept
+            if weekly_count > kept:
+                self.removed[pk] = weekly_count - kept
+            if ordered_count > kept:
+                self.added[pk] = ordered_count - kept
+
+    @classmethod
+    def from_baskets(cls, orderbasket, weeklybasket):
+        '''
+        Uses the prefetched contents of the baskets if there are any.
+
+        Args:
+          orderbasket: The order basket, may be unsaved.
+          weeklybasket: The weekly basket, may be None.
+
+        Returns:
+
+        '''
+        weekly = []
+        if weeklybasket is not None:
+            weekly = weeklybasket.contents.all()
+        ordered = []
+        if orderbasket.pk is not None:
+            ordered = [(line.portion, line.count)
+                       for line in orderbasket.orderbasketproduct_set.all()]
+        return cls(weekly, ordered, orderbasket.edited_weekly_basket)
+
+    def choices(self, counter):
+        '''
+
+        Args:
+          counter: One of the Counters of this diff.
+
+        Returns:
+          The (id, label) choices of the portions in the counter.
+
+        '''
+        return [(pk, str(self.portions[pk]))
+                for pk in self.portions if counter[pk]]
+
+    def items(self, counter):
+        '''
+
+        Args:
+          counter: One of the Counters of this diff.
+
+        Returns:
+          A list of (portion, count) of the portions in the counter.
+
+        '''
+        return [(self.portions[pk], counter[pk])
+                for pk in self.portions if counter[pk]]
+
+    def effective(self):
+        '''
+        The Counter of all portions the member gets this week.
+        '''
+        return self.kept + self.added
+
+    def with_selection(self, selected):
+        '''
+
+        Args:
+          selected: Iterable of the ids of the weekly basket portions to
+            keep.
+
+        Returns:
+          The Counter of the line items of the order basket, if the weekly
+          basket gets edited to the selection.
+
+        '''
+        return (self.weekly & Counter(selected)) + self.added
+
+
+def apply_standing_orders(weekly, changes):
+    '''
+    The line items of an order basket created for a week with standing
+    orders. Removals and exchanges only take portions the weekly basket
+    still holds, in the order of the changes.
+
+    Args:
+      weekly: Counter of the weekly basket portion ids.
+      changes: Iterable of (removed portion id, added portion id, count) of
+        the standing orders, where either portion may be None.
+
+    Returns:
+      A tuple of the edited_weekly_basket flag and the Counter of the line
+      items.
+
+    '''
+    kept = Counter(weekly)
+    added = Counter()
+    for removed, portion, count in changes:
+        if removed is not None:
+            count = min(count, kept[removed])
+            kept[removed] -= count
+        if portion is not None and count > 0:
+            added[portion] += count
+    kept = +kept
+    if kept != weekly:
+        return True, kept + added
+    return False, added
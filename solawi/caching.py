@@ -0,0 +1,73 @@
+import threading
+import time
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _version_key(name, *parts):
+    ''' '''
+    return ':'.join(['solawi', 'version', name] + [str(part)
+                                                  for part in parts])
+
+
+_last_version = [0]
+_version_lock = threading.Lock()
+
+
+def _new_version():
+    '''
+    A version that never was used before, so fragments cached under an
+    evicted version key can not come back. The versions are the
+    microseconds since the epoch, increasing within the process even if
+    two are taken in the same microsecond.
+    '''
+    with _version_lock:
+        _last_version[0] = max(int(time.time() * 1000000),
+                               _last_version[0] + 1)
+        return _last_version[0]
+
+
+def versions(*keys):
+    '''
+    Look up several version keys with one cache access.
+
+    Args:
+      *keys: Tuples of a name and further parts, e.g. ('orders', user id,
+        monday).
+
+    Returns:
+      A dict mapping the names to the current versions.
+
+    '''
+    cache_keys = {_version_key(*key): key[0] for key in keys}
+    found = cache.get_many(list(cache_keys))
+    result = {}
+    for cache_key, name in cache_keys.items():
+        if cache_key not in found:
+            cache.add(cache_key, _new_version(), None)
+            found[cache_key] = cache.get(cache_key)
+        result[name] = found[cache_key]
+    return result
+
+
+def bump(name, *parts):
+    '''
+    Invalidate all fragments cached under the version key once the current
+    transaction commits, so no fragment gets cached under the new version
+    with data read before the commit. Every bump sets a new version instead
+    of incrementing the old one, as cache.incr is not atomic on every
+    backend and two concurrent bumps could end on the same version.
+
+    Args:
+      name:
+      *parts:
+
+    Returns:
+
+    '''
+    key = _version_key(name, *parts)
+
+    def set_version():
+        ''' '''
+        cache.set(key, _new_version(), None)
+    transaction.on_commit(set_version)
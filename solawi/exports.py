@@ -0,0 +1,307 @@
+import csv
+import heapq
+import itertools
+from django.db.models import Case, IntegerField, Value, When
+from django.http import StreamingHttpResponse
+from solawi.archive import archived_lines
+from solawi.models import (
+    ArchivedBasket,
+    OrderBasket,
+    OrderBasketProduct,
+    Portion,
+    User,
+    WeeklyBasket,
+)
+from solawi.reports import week_pivot
+from solawi.snapshots import closed_week
+from solawi.standing import pending_baskets
+from solawi import utils
+
+PACKING_LIST_HEADER = ['Depot', 'Member', 'Product', 'Quantity', 'Unit',
+                       'Count']
+HISTORY_HEADER = ['Year', 'Week', 'Depot', 'Member', 'Product', 'Quantity',
+                  'Unit', 'Count', 'Price']
+
+
+class Echo(object):
+    '''
+    A file-like object returning what is written to it, so csv.writer can
+    produce the lines for a streaming response.
+    '''
+
+    def write(self, value):
+        ''' '''
+        return value
+
+
+def weekly_basket_contents():
+    '''
+
+    Returns:
+      A dict mapping the weekly basket ids to a list of (product, quantity,
+      unit, 1) of their portions.
+
+    '''
+    contents = {}
+    for (basket, product, quantity, unit) in \
+            WeeklyBasket.contents.through.objects.order_by(
+                'portion__food__name', 'portion__quantity').values_list(
+                    'weeklybasket', 'portion__food__name', 'portion__quantity',
+                    'portion__food__unit'):
+        contents.setdefault(basket, []).append((product, quantity, unit, 1))
+    return contents
+
+
+def packing_list_rows(depot, week=None):
+    '''
+    The packing list of a depot in a week: one row per member and portion.
+    Members, their order baskets and line items are streamed ordered by
+    member and merged, so only the line items of one member are held at a
+    time. Members without an order basket get the one of their standing
+    orders, as close_week materializes it before it snapshots the week.
+
+    Args:
+      depot:
+      week: A day of the week. (Default value = None)
+
+    Returns:
+      Yields the header and the rows.
+
+    '''
+    monday = utils.get_moday(week)
+    closed = closed_week(monday)
+    if closed is not None:
+        yield from closed_packing_list_rows(depot, closed)
+        return
+    weekly = weekly_basket_contents()
+    pending = pending_baskets(monday)
+    portions = {}
+    if pending:
+        portions = {pk: (product, quantity, unit)
+                    for (pk, product, quantity, unit)
+                    in Portion.objects.values_list(
+                        'pk', 'food__name', 'quantity', 'food__unit')}
+    members = User.objects.filter(depot=depot).order_by('pk').values_list(
+        'pk', 'first_name', 'last_name', 'username', 'weeklybasket',
+        'is_member').iterator()
+    baskets = OrderBasket.objects.filter(
+        week=monday, user__depot=depot).order_by('user').values_list(
+            'user', 'edited_weekly_basket').iterator()
+    lines = OrderBasketProduct.objects.filter(
+        basket__week=monday, basket__user__depot=depot).order_by(
+            'basket__user', 'portion__food__name',
+            'portion__quantity').values_list(
+                'basket__user', 'portion__food__name', 'portion__quantity',
+                'portion__food__unit', 'count').iterator()
+    lines_by_member = itertools.groupby(lines, key=lambda line: line[0])
+    current_basket = next(baskets, None)
+    current = next(lines_by_member, None)
+
+    yield PACKING_LIST_HEADER
+    for (pk, first_name, last_name, username, basket, is_member) in members:
+        name = utils.member_name(first_name, last_name, username)
+        member_lines = []
+        edited = False
+        # A member can have edited the weekly basket away without any line
+        # item left, so the flag is read from the order baskets.
+        while current_basket is not None and current_basket[0] < pk:
+            current_basket = next(baskets, None)
+        if current_basket is not None and current_basket[0] == pk:
+            edited = current_basket[1]
+            current_basket = next(baskets, None)
+        while current is not None and current[0] < pk:
+            current = next(lines_by_member, None)
+        if current is not None and current[0] == pk:
+            member_lines = [line[1:] for line in current[1]]
+            current = next(lines_by_member, None)
+        if pk in pending:
+            edited, counts = pending[pk]
+            member_lines = sorted(portions[portion] + (count,)
+                                  for portion, count in counts.items())
+        if is_member and not edited:
+            for row in weekly.get(basket, []):
+                yield [depot.name, name] + list(row)
+        for line in member_lines:
+            yield [depot.name, name] + list(line)
+
+
+def closed_packing_list_rows(depot, closed):
+    '''
+    The packing list of a depot in a closed week, read from its snapshots.
+
+    Args:
+      depot:
+      closed: The ClosedWeek.
+
+    Returns:
+      Yields the header and the rows.
+
+    '''
+    yield PACKING_LIST_HEADER
+    for (first_name, last_name, username, product, quantity, unit,
+         count) in closed.baskets.filter(depot=depot).order_by(
+             'user', 'product__name', 'quantity').values_list(
+                 'user__first_name', 'user__last_name', 'user__username',
+                 'product__name', 'quantity', 'product__unit',
+                 'count').iterator():
+        yield [depot.name, utils.member_name(first_name, last_name, username),
+               product, quantity, unit, count]
+
+
+def totals_rows(week=None):
+    '''
+    The ordered quantities of all products per depot in a week.
+
+    Args:
+      week: A day of the week. (Default value = None)
+
+    Returns:
+      Yields the header and the rows.
+
+    '''
+    pivot = week_pivot(week)
+    yield ['Product'] + [pivot.column_labels[column]
+                         for column in pivot.columns] + ['Total']
+    for label, values in pivot:
+        yield [label] + values + [sum(values)]
+    yield ['Total'] + pivot.column_totals() + [pivot.total()]
+
+
+def history_key(line):
+    '''
+    The order of the history lines: week, depot name, member and portion,
+    with the members without a depot first. history_rows orders the line
+    items in the database the same way.
+    '''
+    return line[0], line[1] is not None, line[1] or '', line[2], line[3]
+
+
+def archived_history_lines(first_week, last_week):
+    '''
+    The line items of the archived baskets between two weeks, in the
+    columns and the order of the line items in history_rows. Only the lines
+    of one week are held at a time.
+
+    Args:
+      first_week: A day of the first week.
+      last_week: A day of the last week.
+
+    Returns:
+      Yields the lines.
+
+    '''
+    lines = archived_lines(first_week, last_week)
+    first = next(lines, None)
+    if first is None:
+        return
+    users = {pk: (depot, user_names) for (pk, depot, *user_names)
+             in User.objects.filter(
+                 pk__in=ArchivedBasket.objects.filter(
+                     week__gte=utils.get_moday(first_week),
+                     week__lte=utils.get_moday(last_week)).values(
+                         'user')).values_list(
+                     'pk', 'depot__name', 'first_name', 'last_name',
+                     'username').iterator()}
+    portions = {pk: (product, quantity, unit)
+                for (pk, product, quantity, unit)
+                in Portion.objects.values_list('pk', 'food__name', 'quantity',
+                                               'food__unit')}
+    for monday, week_lines in itertools.groupby(
+            itertools.chain([first], lines), key=lambda line: line[0]):
+        rows = []
+        for (monday, user, edited, portion, count, price) in week_lines:
+            if portion not in portions:
+                # The line items of a deleted portion are deleted as well.
+                continue
+            depot, user_names = users[user]
+            rows.append((monday, depot, user, portion) + tuple(user_names) +
+                        portions[portion] + (count, price))
+        rows.sort(key=history_key)
+        yield from rows
+
+
+def history_rows(first_week, last_week):
+    '''
+    All line items of the order baskets between two weeks, including the
+    archived ones.
+
+    Args:
+      first_week: A day of the first week.
+      last_week: A day of the last week.
+
+    Returns:
+      Yields the header and the rows.
+
+    '''
+    # The backends sort NULLs differently, so the members without a depot
+    # are put first explicitly, as history_key does.
+    lines = OrderBasketProduct.objects.filter(
+        basket__week__gte=utils.get_moday(first_week),
+        basket__week__lte=utils.get_moday(last_week)).annotate(
+            has_depot=Case(When(basket__user__depot__isnull=True,
+                                then=Value(0)),
+                           default=Value(1), output_field=IntegerField()))
+    lines = lines.order_by(
+        'basket__week', 'has_depot', 'basket__user__depot__name',
+        'basket__user', 'portion').values_list(
+            'basket__week', 'basket__user__depot__name', 'basket__user',
+            'portion', 'basket__user__first_name', 'basket__user__last_name',
+            'basket__user__username', 'portion__food__name',
+            'portion__quantity', 'portion__food__unit', 'count',
+            'price').iterator()
+    yield HISTORY_HEADER
+    for (monday, depot, user, portion, first_name, last_name, username,
+         product, quantity, unit, count, price) in heapq.merge(
+             lines, archived_history_lines(first_week, last_week),
+             key=history_key):
+        year, week = utils.year_week(monday)
+        yield [year, week, depot,
+               utils.member_name(first_name, last_name, username),
+               product, quantity, unit, count, price]
+
+
+def write_csv(rows, output):
+    '''
+
+    Args:
+      rows: Iterable of rows.
+      output: A file opened for writing.
+
+    Returns:
+
+    '''
+    csv.writer(output).writerows(rows)
+
+
+def stream_csv(rows, filename):
+    '''
+
+    Args:
+      rows: Iterable of rows, consumed while the response is sent.
+      filename:
+
+    Returns:
+      A StreamingHttpResponse with the rows as CSV.
+
+    '''
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse((writer.writerow(row) for row in rows),
+                                     content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="{f}"'.format(
+        f=filename)
+    return response
+
+
+def week_filename(name, week):
+    '''
+
+    Args:
+      name:
+      week: A day of the week.
+
+    Returns:
+
+    '''
+    year, week = utils.year_week(week)
+    return '{name}-{year}-{week:02d}.csv'.format(name=name, year=year,
+                                                 week=week)
@@ -1,56 +1,156 @@
-import copy
 from django import forms
-from solawi.models import (
-    User,
-    OrderBasket,
-    WeeklyBasket,
-)
+from django.utils.translation import ugettext_lazy as _
+from solawi.baskets import BasketDiff
+from solawi.models import Depot, OrderBasket, Portion, WeeklyBasket
+from solawi import utils
 
 
 class WeeklyBasketForm(forms.Form):
     ''' '''
     prefix = 'weekly'
-    contents = forms.MultipleChoiceField(widget=forms.CheckboxSelectMultiple)
+    contents = forms.MultipleChoiceField(widget=forms.CheckboxSelectMultiple,
+                                         required=False)
+    edit = forms.BooleanField(initial=True, widget=forms.HiddenInput)
 
-    def __init__(self, orderbasket, weeklybasket, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def __init__(self, diff, *args, **kwargs):
+        '''
+
+        Args:
+          diff: The BasketDiff of the order basket.
+          *args:
+          **kwargs:
 
-        choices, initial = self._get_weekly_basket_form_choices(orderbasket,
-                                                                weeklybasket)
-        self.fields['contents'].choices = choices
-        self.fields['contents'].initial = initial
+        '''
+        super().__init__(*args, **kwargs)
+        self.fields['contents'].choices = diff.choices(diff.weekly)
+        self.fields['contents'].initial = list(diff.kept)
 
-    def _get_weekly_basket_form_choices(self, orderbasket, weeklybasket):
-        order_set = weekly_set = weeklybasket.contents.all()
-        if orderbasket.edited_weekly_basket:
-            order_set = orderbasket.contents.all()
-        choices = [(i.id, str(i)) for i in weekly_set]
-        initial = [s.id for s in order_set if s in weekly_set]
-        return choices, initial
+    def clean_contents(self):
+        ''' '''
+        return [int(pk) for pk in self.cleaned_data['contents']]
 
 
 class OrderBasketForm(forms.ModelForm):
     ''' '''
     prefix = 'basket'
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, diff=None, portions=None, **kwargs):
+        '''
+
+        Args:
+          *args:
+          diff: The BasketDiff of the order basket. (Default value = None)
+          portions: The portions of the catalogue with their products, to
+            label the choices without a query per portion. (Default value =
+            None, loaded here)
+          **kwargs:
+
+        '''
         super().__init__(*args, **kwargs)
 
+        if diff is not None and 'contents' not in kwargs.get('initial', {}):
+            # The line items are in the diff already, the initial value of
+            # the model would query them again.
+            self.initial['contents'] = list(diff.ordered) \
+                if self.instance.pk is not None else []
         if self.instance.edited_weekly_basket:
-            order_set = self.instance.contents.all()
-            weekly_set = list(self.instance.user.weeklybasket.contents.all())
-            already_removed = [False] * len(weekly_set)
-            choices = []
-            for item in order_set:
-                if item not in weekly_set:
-                    choices.append(item)
-                elif already_removed[weekly_set.index(item)]:
-                    choices.append(item)
-                else:
-                    already_removed[weekly_set.index(item)] = True
-            self.fields['contents'].choices = choices
+            if diff is None:
+                diff = BasketDiff.from_baskets(
+                    self.instance, self.instance.user.weeklybasket)
+            self.fields['contents'].choices = diff.choices(diff.added)
+        else:
+            if portions is None:
+                portions = Portion.objects.select_related('food')
+            self.fields['contents'].choices = [
+                (portion.pk, str(portion)) for portion in portions]
 
     class Meta:
         ''' '''
         model = OrderBasket
         fields = ['contents']
+
+
+class OrderBasketAdminForm(forms.ModelForm):
+    '''
+    The order basket of the admin. Like the week view it takes no baskets
+    for a week whose orders are closed, the baskets of closed weeks are
+    read-only in OrderBasketAdmin.
+    '''
+
+    class Meta:
+        ''' '''
+        model = OrderBasket
+        fields = '__all__'
+
+    def clean(self):
+        ''' '''
+        cleaned_data = super().clean()
+        week = cleaned_data.get('week')
+        if week is not None and utils.orders_closed(week):
+            raise forms.ValidationError(
+                {'week': _('The orders of this week are already closed.')})
+        return cleaned_data
+
+
+class VacationForm(forms.Form):
+    '''
+    The first and the last week of a vacation, given by any of their days.
+    '''
+    MAX_WEEKS = 53
+
+    first = forms.DateField()
+    last = forms.DateField()
+
+    def clean(self):
+        ''' '''
+        cleaned_data = super().clean()
+        first = cleaned_data.get('first')
+        last = cleaned_data.get('last')
+        if first is None or last is None:
+            return cleaned_data
+        first = utils.get_moday(first)
+        last = utils.get_moday(last)
+        if last < first:
+            raise forms.ValidationError(
+                _('The last week is before the first week.'))
+        if (last - first).days // 7 >= self.MAX_WEEKS:
+            raise forms.ValidationError(
+                _('A vacation can not be longer than {weeks} weeks.').format(
+                    weeks=self.MAX_WEEKS))
+        if utils.orders_closed(first):
+            raise forms.ValidationError(
+                _('The orders of the first week are already closed.'))
+        return cleaned_data
+
+
+class AssignMembersForm(forms.Form):
+    '''
+    The values assigned to the selected users by the assign members action
+    of the user admin. Empty fields are left as they are.
+    '''
+    FLAG_CHOICES = (('', _('unchanged')), ('1', _('yes')), ('0', _('no')))
+
+    depot = forms.ModelChoiceField(Depot.objects.all(), required=False)
+    weeklybasket = forms.ModelChoiceField(WeeklyBasket.objects.all(),
+                                          required=False)
+    is_member = forms.TypedChoiceField(choices=FLAG_CHOICES, coerce=int,
+                                       empty_value=None, required=False)
+    is_supervisor = forms.TypedChoiceField(choices=FLAG_CHOICES, coerce=int,
+                                           empty_value=None, required=False)
+
+    def changes(self):
+        '''
+
+        Returns:
+          A dict of the fields to assign, with the ids of the depot and
+          weekly basket.
+
+        '''
+        changes = {}
+        for field in ['depot', 'weeklybasket']:
+            if self.cleaned_data[field] is not None:
+                changes[field] = self.cleaned_data[field].pk
+        for field in ['is_member', 'is_supervisor']:
+            if self.cleaned_data[field] is not None:
+                changes[field] = bool(self.cleaned_data[field])
+        return changes
@@ -0,0 +1,197 @@
+import io
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.translation import ugettext as _
+from solawi.exports import (
+    closed_packing_list_rows,
+    totals_rows,
+    week_filename,
+    write_csv,
+)
+from solawi.models import ClosedWeek, Depot, OutboxMail, User
+from solawi import utils
+
+
+def _csv(rows):
+    ''' '''
+    output = io.StringIO()
+    write_csv(rows, output)
+    return output.getvalue()
+
+
+def queue_week_mails(closed, members=None):
+    '''
+    Render the mails about a closed week into the outbox: a summary with the
+    packing list for every depot supervisor, the totals of all depots for
+    every staff member and, if wanted, a confirmation of the basket for
+    every member. Everything is read from the snapshots of the week, with
+    one query per depot for its packing list. Mails which already are in
+    the outbox are not queued again. The week is marked as queued, even if
+    it has no mails.
+
+    Args:
+      closed: The ClosedWeek.
+      members: Also queue the member confirmations. (Default value = None,
+        settings.MAIL_MEMBER_CONFIRMATIONS)
+
+    Returns:
+      The number of queued mails.
+
+    '''
+    if members is None:
+        members = settings.MAIL_MEMBER_CONFIRMATIONS
+    year, week = utils.year_week(closed.week)
+    queued = set(closed.mails.values_list('kind', 'user'))
+    depots = Depot.objects.in_bulk()
+    totals = {}
+    for (depot, product, unit, quantity, price) in closed.totals.order_by(
+            'product__name').values_list('depot', 'product__name',
+                                         'product__unit', 'quantity',
+                                         'price'):
+        totals.setdefault(depot, []).append((product, unit, quantity, price))
+    mails = []
+
+    def add(kind, user, email, name, subject, context, attachment_name='',
+            attachment=''):
+        ''' '''
+        if (kind, user) in queued:
+            return
+        context.update(name=name, year=year, week=week)
+        mails.append(OutboxMail(
+            week=closed, kind=kind, user_id=user, recipient=email,
+            subject=subject.format(year=year, week=week),
+            body=render_to_string('mail/{kind}.txt'.format(kind=kind),
+                                  context),
+            attachment_name=attachment_name, attachment=attachment))
+
+    recipients = User.objects.exclude(email='').values_list(
+        'pk', 'email', 'first_name', 'last_name', 'username')
+    packing_lists = {}
+    for (pk, email, first_name, last_name, username, depot) in \
+            recipients.filter(is_supervisor=True,
+                              depot__isnull=False).values_list(
+                                  'pk', 'email', 'first_name', 'last_name',
+                                  'username', 'depot'):
+        if depot not in packing_lists:
+            packing_lists[depot] = _csv(closed_packing_list_rows(
+                depots[depot], closed))
+        add(OutboxMail.SUPERVISOR, pk, email,
+            utils.member_name(first_name, last_name, username),
+            _('Packing list of week {year}-{week}'),
+            {'depot': depots[depot].name, 'totals': totals.get(depot, [])},
+            week_filename('packing-list', closed.week), packing_lists[depot])
+
+    staff = list(recipients.filter(is_staff=True))
+    if staff:
+        by_depot = [(depots[depot].name if depot is not None else '-',
+                     products)
+                    for depot, products in sorted(
+                        totals.items(),
+                        key=lambda item: depots[item[0]].name
+                        if item[0] is not None else '')]
+        attachment = _csv(totals_rows(closed.week))
+        for (pk, email, first_name, last_name, username) in staff:
+            add(OutboxMail.ORDERING, pk, email,
+                utils.member_name(first_name, last_name, username),
+                _('Orders of week {year}-{week}'), {'depots': by_depot},
+                week_filename('totals', closed.week), attachment)
+
+    if members:
+        baskets = {}
+        for (user, product, quantity, unit, count) in closed.baskets.order_by(
+                'product__name', 'quantity').values_list(
+                    'user', 'product__name', 'quantity', 'product__unit',
+                    'count'):
+            baskets.setdefault(user, []).append(
+                (product, quantity, unit, count))
+        for (pk, email, first_name, last_name, username) in \
+                recipients.filter(pk__in=closed.baskets.values('user')):
+            add(OutboxMail.MEMBER, pk, email,
+                utils.member_name(first_name, last_name, username),
+                _('Your basket of week {year}-{week}'),
+                {'basket': baskets[pk]})
+
+    OutboxMail.objects.bulk_create(mails)
+    ClosedWeek.objects.filter(pk=closed.pk).update(
+        mails_queued=timezone.now())
+    return len(mails)
+
+
+def message(mail, connection=None):
+    '''
+
+    Args:
+      mail: An OutboxMail.
+      connection: (Default value = None)
+
+    Returns:
+      The EmailMessage of the mail.
+
+    '''
+    email = EmailMessage(mail.subject, mail.body, to=[mail.recipient],
+                         connection=connection)
+    if mail.attachment_name:
+        email.attach(mail.attachment_name, mail.attachment, 'text/csv')
+    return email
+
+
+def send_outbox(batch_size=100, max_attempts=None, connection=None):
+    '''
+    Send the waiting mails of the outbox over one connection. The mails are
+    read and marked in batches; each mail is handed to the connection on its
+    own, so a failing recipient neither stops the batch nor gets the others
+    sent twice. A failed mail stays in the outbox with its error until it
+    was tried max_attempts times.
+
+    Args:
+      batch_size: (Default value = 100)
+      max_attempts: (Default value = None, settings.MAIL_MAX_ATTEMPTS)
+      connection: An e-mail connection. (Default value = None, a new
+        connection of the EMAIL_BACKEND)
+
+    Returns:
+      A tuple of the numbers of sent and failed mails.
+
+    '''
+    if max_attempts is None:
+        max_attempts = settings.MAIL_MAX_ATTEMPTS
+    if connection is None:
+        connection = get_connection()
+    waiting = OutboxMail.objects.filter(
+        sent__isnull=True, attempts__lt=max_attempts).order_by('pk')
+    sent = failed = 0
+    last = 0
+    reopen = False
+    connection.open()
+    try:
+        while True:
+            batch = list(waiting.filter(pk__gt=last)[:batch_size])
+            if not batch:
+                break
+            last = batch[-1].pk
+            succeeded = []
+            for mail in batch:
+                try:
+                    if reopen:
+                        reopen = False
+                        connection.open()
+                    connection.send_messages([message(mail, connection)])
+                except Exception as error:
+                    failed += 1
+                    OutboxMail.objects.filter(pk=mail.pk).update(
+                        attempts=F('attempts') + 1, error=str(error))
+                    # The connection may be broken, so the next mail gets
+                    # a new one.
+                    connection.close()
+                    reopen = True
+                else:
+                    succeeded.append(mail.pk)
+            OutboxMail.objects.filter(pk__in=succeeded).update(
+                sent=timezone.now(), attempts=F('attempts') + 1, error='')
+            sent += len(succeeded)
+    finally:
+        connection.close()
+    return sent, failed
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from solawi.archive import archivable_weeks, archive_week, restore_week
+from solawi.models import run_in_transaction
+from solawi import utils
+
+
+class Command(BaseCommand):
+    ''' '''
+    help = ('Pack the order baskets of the closed weeks older than '
+            'ARCHIVE_AFTER_WEEKS into archived baskets, or restore the '
+            'archived baskets of a week.')
+
+    def add_arguments(self, parser):
+        '''
+
+        Args:
+          parser:
+
+        Returns:
+
+        '''
+        parser.add_argument('--weeks', type=int, default=None,
+                            help='Archive the closed weeks older than this '
+                            'many weeks instead.')
+        parser.add_argument('--restore', action='store_true',
+                            help='Restore the week given by --year and '
+                            '--week instead.')
+        parser.add_argument('--year', type=int, default=None)
+        parser.add_argument('--week', type=int, default=None)
+
+    def handle(self, *args, **options):
+        '''
+
+        Args:
+          *args:
+          **options:
+
+        Returns:
+
+        '''
+        if options['restore']:
+            if options['year'] is None or options['week'] is None:
+                raise CommandError('--restore needs the --year and --week '
+                                   'to restore.')
+            monday = utils.date_from_week(options['year'], options['week'])
+            restored = run_in_transaction(lambda: restore_week(monday))
+            self.stdout.write('{week}: {count} baskets restored'.format(
+                week=monday, count=restored))
+            return
+        for monday in archivable_weeks(options['weeks']):
+            archived = run_in_transaction(lambda: archive_week(monday))
+            self.stdout.write('{week}: {count} baskets archived'.format(
+                week=monday, count=archived))
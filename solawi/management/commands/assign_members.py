@@ -0,0 +1,120 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from solawi.assignments import FIELDS, assign_members
+from solawi.models import Depot, User, WeeklyBasket
+
+FLAGS = {'1': True, 'yes': True, 'true': True,
+         '0': False, 'no': False, 'false': False}
+
+
+class Command(BaseCommand):
+    ''' '''
+    help = ('Assign depots, weekly baskets and the is_member and '
+            'is_supervisor flags to the users listed in a CSV file with a '
+            'username column and any of the columns depot, weeklybasket, '
+            'is_member and is_supervisor. Depots and weekly baskets are '
+            'given by name, - clears them and empty cells are left as they '
+            'are. The users are written with bulk updates, invalid rows are '
+            'reported and skipped.')
+
+    def add_arguments(self, parser):
+        '''
+
+        Args:
+          parser:
+
+        Returns:
+
+        '''
+        parser.add_argument('path', help='The CSV file.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be assigned.')
+
+    def handle(self, *args, **options):
+        '''
+
+        Args:
+          *args:
+          **options:
+
+        Returns:
+
+        '''
+        with open(options['path'], newline='') as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        if rows and 'username' not in rows[0]:
+            raise CommandError('The CSV file has no username column.')
+        names = {
+            'depot': dict(Depot.objects.values_list('name', 'pk')),
+            'weeklybasket': dict(WeeklyBasket.objects.values_list('name',
+                                                                  'pk')),
+        }
+        users = dict(User.objects.filter(
+            username__in=[row['username'] for row in rows]).values_list(
+                'username', 'pk'))
+
+        assignments = {}
+        lines = {}
+        rejected = []
+        # The header is line 1.
+        for line, row in enumerate(rows, 2):
+            try:
+                user, changes = self.parse_row(row, users, names)
+                if user in assignments:
+                    raise ValueError('listed twice')
+            except ValueError as error:
+                rejected.append((line, row['username'], str(error)))
+                continue
+            assignments[user] = changes
+            lines[user] = (line, row['username'])
+
+        with transaction.atomic():
+            updated, invalid = assign_members(assignments)
+            if options['dry_run']:
+                transaction.set_rollback(True)
+        rejected.extend(lines[user] + (str(reason),)
+                        for user, reason in invalid.items())
+        for line, username, reason in sorted(rejected):
+            self.stderr.write('line {line} ({username}): {reason}'.format(
+                line=line, username=username, reason=reason))
+        self.stdout.write('{updated} users {done}, {rejected} rows '
+                          'rejected'.format(
+                              updated=updated, rejected=len(rejected),
+                              done='would be updated' if options['dry_run']
+                              else 'updated'))
+
+    def parse_row(self, row, users, names):
+        '''
+
+        Args:
+          row: A dict of the CSV columns.
+          users: A dict mapping the usernames to the user ids.
+          names: A dict mapping depot and weeklybasket to dicts mapping the
+            names to the ids.
+
+        Returns:
+          A tuple of the user id and the dict of the changes.
+
+        '''
+        if row['username'] not in users:
+            raise ValueError('there is no such user')
+        changes = {}
+        for field in FIELDS:
+            value = (row.get(field) or '').strip()
+            if not value:
+                continue
+            if field in names:
+                if value == '-':
+                    changes[field] = None
+                elif value in names[field]:
+                    changes[field] = names[field][value]
+                else:
+                    raise ValueError('there is no {field} {value}'.format(
+                        field=field, value=value))
+            elif value.lower() in FLAGS:
+                changes[field] = FLAGS[value.lower()]
+            else:
+                raise ValueError('{value} is no value for {field}'.format(
+                    value=value, field=field))
+        return users[row['username']], changes
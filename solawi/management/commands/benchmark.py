@@ -0,0 +1,199 @@
+import datetime
+import json
+import time
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from solawi.models import Depot, Portion, User
+from solawi.synthetic import seed_farm
+from solawi import utils
+
+# The maximal number of queries per request. None means not asserted.
+QUERY_BUDGETS = {
+    'week get': 5,
+    'week post': None,
+    'depot get': 6,
+    'admin orderbasket': 8,
+    # The projection columns read the account entries, the weekly basket
+    # values and the standing orders of the page.
+    'admin user': 9,
+    'admin weeklybasket': 7,
+    'admin product': 6,
+    'admin depot': 6,
+}
+
+
+class Command(BaseCommand):
+    ''' '''
+    help = ('Measure the query count and wall time of the member views and '
+            'the admin changelists on synthetic farms of several sizes. '
+            'Fails if a query budget is exceeded.')
+
+    def add_arguments(self, parser):
+        '''
+
+        Args:
+          parser:
+
+        Returns:
+
+        '''
+        parser.add_argument('--scales', default='100,1000',
+                            help='Comma separated numbers of members.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Requests per measurement.')
+        parser.add_argument('--output', default=None,
+                            help='Write the results as JSON to this file.')
+        parser.add_argument('--compare', default=None,
+                            help='JSON file of an earlier run to compare '
+                            'with.')
+
+    def handle(self, *args, **options):
+        '''
+
+        Args:
+          *args:
+          **options:
+
+        Returns:
+
+        '''
+        scales = [int(scale) for scale in options['scales'].split(',')]
+        results = {}
+        # The farms are rolled back, which does not bump the cache versions,
+        # so their fragments must not end up in the cache of the site.
+        caches = {'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'benchmark',
+        }}
+        with override_settings(ALLOWED_HOSTS=['testserver'], CACHES=caches):
+            for scale in scales:
+                results[str(scale)] = self.run_scale(scale, options['repeat'])
+
+        report = {
+            'date': datetime.datetime.now().isoformat(),
+            'django': django.get_version(),
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+
+        previous = {}
+        if options['compare']:
+            with open(options['compare']) as compare:
+                previous = json.load(compare)['results']
+
+        violations = []
+        for scale, measurements in results.items():
+            for name, measurement in sorted(measurements.items()):
+                line = '{scale:>7} {name:<20} {queries:>5} queries ' \
+                    '{ms:>9.2f} ms'.format(scale=scale, name=name,
+                                           queries=measurement['queries'],
+                                           ms=measurement['seconds'] * 1000)
+                before = previous.get(scale, {}).get(name)
+                if before:
+                    line += ' (was {queries} queries {ms:.2f} ms)'.format(
+                        queries=before['queries'],
+                        ms=before['seconds'] * 1000)
+                self.stdout.write(line)
+                budget = QUERY_BUDGETS.get(name)
+                if budget is not None and measurement['queries'] > budget:
+                    violations.append(
+                        '{name} at {scale} members: {queries} queries, '
+                        'budget {budget}'.format(
+                            name=name, scale=scale, budget=budget,
+                            queries=measurement['queries']))
+        if violations:
+            raise CommandError('Query budgets exceeded:\n' +
+                               '\n'.join(violations))
+
+    def run_scale(self, scale, repeat):
+        '''
+        Seed a farm with the given number of members, measure all requests
+        and roll everything back. Starts with an empty cache, so the first
+        request of each measurement is a cold one.
+
+        Args:
+          scale:
+          repeat:
+
+        Returns:
+          A dict mapping the request names to their query count and the
+          median wall time in seconds.
+
+        '''
+        results = {}
+        cache.clear()
+        with transaction.atomic():
+            seed_farm(depots=max(1, scale // 100), members=scale,
+                      prefix='benchmark', seed=scale)
+            member = User.objects.filter(
+                username__startswith='benchmark-member-').first()
+            admin = User.objects.create(
+                username='benchmark-admin', is_staff=True,
+                is_superuser=True, is_member=False)
+            member_client = Client()
+            member_client.force_login(member)
+            admin_client = Client()
+            admin_client.force_login(admin)
+
+            portions = list(Portion.objects.filter(
+                food__name__startswith='benchmark-').values_list(
+                    'pk', flat=True)[:3])
+            depot = Depot.objects.filter(
+                name__startswith='benchmark-').first()
+            # The orders of the current week may already be closed.
+            next_week = '/woche/{0}/{1:02d}/'.format(*utils.year_week(
+                datetime.date.today() + datetime.timedelta(7)))
+            requests = [
+                ('week get', member_client, 'get', '/woche/', None),
+                ('week post', member_client, 'post', next_week,
+                 {'basket-contents': portions}),
+                ('depot get', member_client, 'get',
+                 '/depot/{pk}/'.format(pk=depot.pk), None),
+            ]
+            for model in ('orderbasket', 'user', 'weeklybasket', 'product',
+                          'depot'):
+                requests.append(
+                    ('admin ' + model, admin_client, 'get',
+                     '/admin/solawi/{model}/'.format(model=model), None))
+
+            for (name, client, method, url, data) in requests:
+                results[name] = self.measure(client, method, url, data,
+                                             repeat)
+            transaction.set_rollback(True)
+        return results
+
+    def measure(self, client, method, url, data, repeat):
+        '''
+
+        Args:
+          client:
+          method:
+          url:
+          data:
+          repeat:
+
+        Returns:
+
+        '''
+        timings = []
+        for i in range(repeat):
+            reset_queries()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = getattr(client, method)(url, data or {})
+                timings.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                raise CommandError('{method} {url} returned {status}'.format(
+                    method=method.upper(), url=url,
+                    status=response.status_code))
+        timings.sort()
+        return {
+            'queries': len(queries.captured_queries),
+            'seconds': timings[len(timings) // 2],
+        }
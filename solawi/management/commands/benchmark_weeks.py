@@ -0,0 +1,54 @@
+import datetime
+import timeit
+from django.core.management.base import BaseCommand
+from solawi import utils
+
+
+class Command(BaseCommand):
+    ''' '''
+    help = ('Compare the week calendar of solawi.utils with the former '
+            'strptime/strftime implementation.')
+
+    def add_arguments(self, parser):
+        '''
+
+        Args:
+          parser:
+
+        Returns:
+
+        '''
+        parser.add_argument('--number', type=int, default=100000,
+                            help='Calls per measurement.')
+
+    def handle(self, *args, **options):
+        '''
+
+        Args:
+          *args:
+          **options:
+
+        Returns:
+
+        '''
+        number = options['number']
+        today = datetime.date.today()
+        cases = [
+            ('date_from_week',
+             lambda: utils.date_from_week_strptime(2017, 14),
+             lambda: utils.date_from_week(2017, 14)),
+            ('this_week',
+             lambda: int(datetime.date.today().strftime('%W')),
+             utils.this_week),
+            ('year_week',
+             lambda: (today.year, int(today.strftime('%W'))),
+             lambda: utils.year_week(today)),
+        ]
+        for name, old, new in cases:
+            old_time = min(timeit.repeat(old, number=number, repeat=3))
+            new_time = min(timeit.repeat(new, number=number, repeat=3))
+            self.stdout.write(
+                '{name}: {old:.3f}us -> {new:.3f}us ({speedup:.1f}x)'.format(
+                    name=name, old=old_time / number * 1e6,
+                    new=new_time / number * 1e6,
+                    speedup=old_time / new_time))
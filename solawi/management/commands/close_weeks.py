@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from solawi import snapshots
+from solawi import utils
+
+
+class Command(BaseCommand):
+    ''' '''
+    help = ('Freeze the baskets and totals of the weeks whose orders are '
+            'closed. Meant to run shortly after every order cutoff.')
+
+    def add_arguments(self, parser):
+        '''
+
+        Args:
+          parser:
+
+        Returns:
+
+        '''
+        parser.add_argument('--year', type=int, default=None)
+        parser.add_argument('--week', type=int, default=None,
+                            help='Close only this week, even before its '
+                            'cutoff.')
+
+    def handle(self, *args, **options):
+        '''
+
+        Args:
+          *args:
+          **options:
+
+        Returns:
+
+        '''
+        if options['week'] is not None:
+            weeks = [utils.date_from_week(options['year'], options['week'])]
+        else:
+            weeks = snapshots.due_weeks()
+        for monday in weeks:
+            closed = snapshots.close_week(monday)
+            if closed is None:
+                self.stdout.write('{week} was already closed'.format(
+                    week=monday))
+            else:
+                self.stdout.write('Closed {week}: {baskets} items'.format(
+                    week=monday, baskets=closed.baskets.count()))
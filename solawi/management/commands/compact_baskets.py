@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from solawi.models import OrderBasket
+
+
+class Command(BaseCommand):
+    ''' '''
+    help = ('Delete the order baskets without any line items whose weekly '
+            'basket was not edited. They were created by merely viewing a '
+            'week and carry no information.')
+
+    def add_arguments(self, parser):
+        '''
+
+        Args:
+          parser:
+
+        Returns:
+
+        '''
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of baskets deleted per query.')
+
+    def handle(self, *args, **options):
+        '''
+
+        Args:
+          *args:
+          **options:
+
+        Returns:
+
+        '''
+        empty = OrderBasket.objects.filter(
+            edited_weekly_basket=False,
+            orderbasketproduct__isnull=True).order_by('pk')
+        deleted = 0
+        while True:
+            batch = list(empty.values_list(
+                'pk', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            OrderBasket.objects.filter(pk__in=batch).delete()
+            deleted += len(batch)
+        self.stdout.write('Deleted {n} empty order baskets.'.format(
+            n=deleted))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from solawi.models import rebuild_all_assets
+
+
+class Command(BaseCommand):
+    ''' '''
+    help = ('Recompute the assets of all users over the last '
+            'WEEKS_TO_SAVE_ACCOUNTS weeks and prune the expired account '
+            'entries. Meant to be run nightly from cron.')
+
+    def add_arguments(self, parser):
+        '''
+
+        Args:
+          parser:
+
+        Returns:
+
+        '''
+        parser.add_argument('--batch-size', type=int, default=250,
+                            help='Number of users written per UPDATE.')
+
+    def handle(self, *args, **options):
+        '''
+
+        Args:
+          *args:
+          **options:
+
+        Returns:
+
+        '''
+        changed = rebuild_all_assets(batch_size=options['batch_size'])
+        self.stdout.write('Updated the assets of {n} users.'.format(n=changed))
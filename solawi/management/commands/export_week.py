@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+from django.core.management.base import BaseCommand
+from django.db import connections
+from solawi import exports
+from solawi import utils
+from solawi.models import Depot
+
+
+def export_depot(args):
+    '''
+    Write the packing list of one depot. Runs in a worker process.
+
+    Args:
+      args: The tuple (depot id, Monday of the week, output directory).
+
+    Returns:
+      The path of the written file.
+
+    '''
+    depot_id, monday, output_dir = args
+    depot = Depot.objects.get(pk=depot_id)
+    path = os.path.join(output_dir, exports.week_filename(
+        'packing-list-{pk}'.format(pk=depot_id), monday))
+    with open(path, 'w', newline='') as output:
+        exports.write_csv(exports.packing_list_rows(depot, monday), output)
+    return path
+
+
+class Command(BaseCommand):
+    ''' '''
+    help = ('Write the packing lists of all depots and the totals of a week '
+            'as CSV files.')
+
+    def add_arguments(self, parser):
+        '''
+
+        Args:
+          parser:
+
+        Returns:
+
+        '''
+        parser.add_argument('--year', type=int, default=None)
+        parser.add_argument('--week', type=int, default=None)
+        parser.add_argument('--output-dir', default='.')
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Number of processes writing the packing '
+                            'lists.')
+
+    def handle(self, *args, **options):
+        '''
+
+        Args:
+          *args:
+          **options:
+
+        Returns:
+
+        '''
+        monday = utils.date_from_week(options['year'], options['week'])
+        output_dir = options['output_dir']
+        path = os.path.join(output_dir, exports.week_filename('totals',
+                                                              monday))
+        with open(path, 'w', newline='') as output:
+            exports.write_csv(exports.totals_rows(monday), output)
+        self.stdout.write(path)
+
+        jobs = [(depot_id, monday, output_dir)
+                for depot_id in Depot.objects.values_list('pk', flat=True)]
+        if options['processes'] > 1:
+            # The workers must not share the connection of this process.
+            connections.close_all()
+            with multiprocessing.Pool(options['processes']) as pool:
+                paths = pool.map(export_depot, jobs)
+        else:
+            paths = map(export_depot, jobs)
+        for path in paths:
+            self.stdout.write(path)
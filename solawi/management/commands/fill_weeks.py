@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from solawi import utils
+from solawi.models import Week
+
+
+class Command(BaseCommand):
+    ''' '''
+    help = 'Fill the Week table with the week calendar of some years.'
+
+    def add_arguments(self, parser):
+        '''
+
+        Args:
+          parser:
+
+        Returns:
+
+        '''
+        year = utils.this_year()
+        parser.add_argument('--first-year', type=int, default=year - 1)
+        parser.add_argument('--last-year', type=int, default=year + 1)
+
+    def handle(self, *args, **options):
+        '''
+
+        Args:
+          *args:
+          **options:
+
+        Returns:
+
+        '''
+        first_year = options['first_year']
+        last_year = options['last_year']
+        existing = set(Week.objects.filter(
+            year__gte=first_year, year__lte=last_year).values_list(
+                'year', 'week'))
+        weeks = [Week(year=year, week=week, monday=monday, sunday=sunday,
+                      iso=iso)
+                 for (year, week, monday, sunday, iso)
+                 in utils.iter_weeks(first_year, last_year)
+                 if (year, week) not in existing]
+        Week.objects.bulk_create(weeks)
+        self.stdout.write('Created {n} weeks.'.format(n=len(weeks)))
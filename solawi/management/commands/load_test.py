@@ -0,0 +1,174 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import datetime
+import random
+import threading
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from solawi.models import (
+    Depot,
+    OrderBasketProduct,
+    Portion,
+    Product,
+    User,
+    WeeklyBasket,
+    rebuild_weekly_totals,
+)
+from solawi.synthetic import seed_farm
+from solawi import utils
+
+
+class Command(BaseCommand):
+    ''' '''
+    help = ('Let many members post orders to WeekView at the same time and '
+            'report the throughput, the latency and lost updates. Seeds its '
+            'own synthetic farm and deletes it afterwards.')
+
+    def add_arguments(self, parser):
+        '''
+
+        Args:
+          parser:
+
+        Returns:
+
+        '''
+        parser.add_argument('--members', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=5,
+                            help='Posts per member.')
+        parser.add_argument('--prefix', default='loadtest')
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the synthetic farm.')
+
+    def handle(self, *args, **options):
+        '''
+
+        Args:
+          *args:
+          **options:
+
+        Returns:
+
+        '''
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix + '-').exists():
+            raise CommandError('There is already a farm with the prefix '
+                               '{prefix}.'.format(prefix=prefix))
+        seed_farm(depots=max(1, options['members'] // 50),
+                  members=options['members'], weeks=0, prefix=prefix)
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                self.run(prefix, options['posts'], options['threads'])
+        finally:
+            if not options['keep']:
+                self.delete_farm(prefix)
+
+    def run(self, prefix, posts, threads):
+        '''
+
+        Args:
+          prefix:
+          posts:
+          threads:
+
+        Returns:
+
+        '''
+        # The orders of the current week may already be closed.
+        monday = utils.get_moday() + datetime.timedelta(7)
+        url = '/woche/{0}/{1:02d}/'.format(*utils.year_week(monday))
+        portions = list(Portion.objects.filter(
+            food__name__startswith=prefix + '-').values_list(
+                'pk', flat=True))
+        clients = []
+        for member in User.objects.filter(
+                username__startswith=prefix + '-member-'):
+            client = Client()
+            client.force_login(member)
+            clients.append((member.pk, client))
+
+        rand = random.Random(0)
+        # Every post gets its own client with the session of the member, so
+        # the posts of the same member really run at the same time.
+        jobs = [(member, client.cookies, rand.sample(portions, 2))
+                for member, client in clients for i in range(posts)]
+        rand.shuffle(jobs)
+        lock = threading.Lock()
+        expected = Counter()
+        latencies = []
+        errors = Counter()
+
+        def post(job):
+            ''' '''
+            member, cookies, selected = job
+            client = Client()
+            client.cookies = copy.copy(cookies)
+            start = time.perf_counter()
+            try:
+                response = client.post(url, {'basket-contents': selected})
+                status = response.status_code
+            except Exception as error:
+                status = type(error).__name__
+            finally:
+                connection.close()
+            latency = time.perf_counter() - start
+            with lock:
+                latencies.append(latency)
+                if status == 200:
+                    expected.update((member, portion) for portion in selected)
+                else:
+                    errors[status] += 1
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(post, jobs))
+        elapsed = time.perf_counter() - start
+
+        stored = Counter({
+            (member, portion): count
+            for (member, portion, count) in OrderBasketProduct.objects.filter(
+                basket__week=monday,
+                basket__user__username__startswith=prefix + '-member-'
+            ).values_list('basket__user', 'portion', 'count')})
+        lost = sum((expected - stored).values())
+        drift = rebuild_weekly_totals([monday], fix=False)
+
+        latencies.sort()
+        self.stdout.write('{posts} posts of {members} members in {threads} '
+                          'threads'.format(posts=len(jobs),
+                                           members=len(clients),
+                                           threads=threads))
+        self.stdout.write('throughput {rate:.1f} posts/s'.format(
+            rate=len(jobs) / elapsed))
+        self.stdout.write('latency p50 {p50:.1f} ms, p95 {p95:.1f} ms, '
+                          'max {max:.1f} ms'.format(
+                              p50=latencies[len(latencies) // 2] * 1000,
+                              p95=latencies[int(len(latencies) * 0.95)] *
+                              1000,
+                              max=latencies[-1] * 1000))
+        self.stdout.write('failed posts: {errors}'.format(
+            errors=dict(errors) or 0))
+        self.stdout.write('lost updates: {lost}'.format(lost=lost))
+        self.stdout.write('drifted weekly totals: {drift}'.format(
+            drift=len(drift)))
+        if lost or drift:
+            raise CommandError('Concurrent posts lost updates.')
+
+    def delete_farm(self, prefix):
+        '''
+
+        Args:
+          prefix:
+
+        Returns:
+
+        '''
+        User.objects.filter(username__startswith=prefix + '-').delete()
+        Product.objects.filter(name__startswith=prefix + '-').delete()
+        WeeklyBasket.objects.filter(name__startswith=prefix + '-').delete()
+        Depot.objects.filter(name__startswith=prefix + '-').delete()
@@ -0,0 +1,43 @@
+import datetime
+from django.core.management.base import BaseCommand
+from solawi.models import run_in_transaction
+from solawi.standing import materialize_week
+from solawi import utils
+
+
+class Command(BaseCommand):
+    ''' '''
+    help = ('Create the order baskets of the upcoming weeks from the '
+            'standing orders of the members.')
+
+    def add_arguments(self, parser):
+        '''
+
+        Args:
+          parser:
+
+        Returns:
+
+        '''
+        parser.add_argument('--weeks', type=int, default=1,
+                            help='Materialize this many weeks whose orders '
+                            'are still open.')
+
+    def handle(self, *args, **options):
+        '''
+
+        Args:
+          *args:
+          **options:
+
+        Returns:
+
+        '''
+        monday = utils.get_moday()
+        if utils.orders_closed(monday):
+            monday += datetime.timedelta(7)
+        for i in range(options['weeks']):
+            week = monday + datetime.timedelta(7 * i)
+            created = run_in_transaction(lambda: materialize_week(week))
+            self.stdout.write('{week}: {count} baskets created'.format(
+                week=week, count=created))
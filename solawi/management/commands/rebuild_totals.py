@@ -0,0 +1,50 @@
+import datetime
+from django.core.management.base import BaseCommand
+from solawi.models import rebuild_weekly_totals
+from solawi import utils
+
+
+class Command(BaseCommand):
+    ''' '''
+    help = ('Compare the weekly totals with the line items of the order '
+            'baskets and rewrite the rows that drifted.')
+
+    def add_arguments(self, parser):
+        '''
+
+        Args:
+          parser:
+
+        Returns:
+
+        '''
+        parser.add_argument('--weeks', type=int, default=None,
+                            help='Only check this many weeks up to the '
+                            'next one. By default all weeks are checked.')
+        parser.add_argument('--verify', action='store_true',
+                            help='Only report the drift.')
+
+    def handle(self, *args, **options):
+        '''
+
+        Args:
+          *args:
+          **options:
+
+        Returns:
+
+        '''
+        weeks = None
+        if options['weeks'] is not None:
+            next_monday = utils.get_moday() + datetime.timedelta(7)
+            weeks = [next_monday - datetime.timedelta(7 * i)
+                     for i in range(options['weeks'])]
+        drift = rebuild_weekly_totals(weeks, fix=not options['verify'])
+        for (week, depot, portion), (stored, actual) in sorted(
+                drift.items(), key=lambda item: (item[0][0], str(item[0]))):
+            self.stdout.write('{week} depot {depot} portion {portion}: '
+                              '{stored} instead of {actual}'.format(
+                                  week=week, depot=depot, portion=portion,
+                                  stored=stored, actual=actual))
+        self.stdout.write('{count} drifted totals{fixed}'.format(
+            count=len(drift), fixed='' if options['verify'] else ' fixed'))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from solawi.synthetic import seed_farm
+
+
+class Command(BaseCommand):
+    ''' '''
+    help = ('Create a synthetic SoLaWi with depots, products, members and '
+            'their order history, e.g. for benchmarks.')
+
+    def add_arguments(self, parser):
+        '''
+
+        Args:
+          parser:
+
+        Returns:
+
+        '''
+        parser.add_argument('--depots', type=int, default=5)
+        parser.add_argument('--members', type=int, default=100)
+        parser.add_argument('--products', type=int, default=20)
+        parser.add_argument('--weeks', type=int, default=8,
+                            help='Number of past weeks with orders.')
+        parser.add_argument('--prefix', default='synth',
+                            help='Prefix of all created names.')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Seed of the random generator.')
+
+    def handle(self, *args, **options):
+        '''
+
+        Args:
+          *args:
+          **options:
+
+        Returns:
+
+        '''
+        with transaction.atomic():
+            created = seed_farm(
+                depots=options['depots'], members=options['members'],
+                products=options['products'], weeks=options['weeks'],
+                prefix=options['prefix'], seed=options['seed'])
+        for name, count in created.items():
+            self.stdout.write('{count} {name}'.format(count=count, name=name))
@@ -0,0 +1,91 @@
+import datetime
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from solawi.mailing import queue_week_mails, send_outbox
+from solawi.models import ClosedWeek
+from solawi import utils
+
+
+class Command(BaseCommand):
+    ''' '''
+    help = ('Queue the mails about the recently closed weeks and send the '
+            'outbox. Meant to run after close_weeks, or with --loop as a '
+            'background worker.')
+
+    def add_arguments(self, parser):
+        '''
+
+        Args:
+          parser:
+
+        Returns:
+
+        '''
+        parser.add_argument('--year', type=int, default=None)
+        parser.add_argument('--week', type=int, default=None,
+                            help='Queue the mails of this closed week again. '
+                            'Mails already in its outbox are skipped, '
+                            'e.g. to add the member confirmations '
+                            'later.')
+        parser.add_argument('--members', action='store_true', default=None,
+                            help='Also send every member a confirmation.')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', type=int, default=None,
+                            metavar='SECONDS',
+                            help='Keep running and look for new mails every '
+                            'SECONDS.')
+
+    def handle(self, *args, **options):
+        '''
+
+        Args:
+          *args:
+          **options:
+
+        Returns:
+
+        '''
+        if options['week'] is not None:
+            monday = utils.date_from_week(options['year'], options['week'])
+            closed = ClosedWeek.objects.filter(week=monday).first()
+            if closed is None:
+                raise CommandError('{week} is not closed.'.format(
+                    week=monday))
+            self.queue([closed], options['members'])
+        while True:
+            # Only weeks closed during the last seven days are picked up on
+            # their own, so old weeks do not flood the outbox.
+            self.queue(ClosedWeek.objects.filter(
+                mails_queued__isnull=True,
+                closed__gte=timezone.now() - datetime.timedelta(7)),
+                options['members'])
+            try:
+                sent, failed = send_outbox(options['batch_size'])
+            except OSError as error:
+                # The mail server is not reachable, the outbox is kept.
+                if options['loop'] is None:
+                    raise CommandError(error)
+                self.stderr.write(str(error))
+            else:
+                if sent or failed:
+                    self.stdout.write('Sent {sent} mails, {failed} '
+                                      'failed'.format(sent=sent,
+                                                      failed=failed))
+            if options['loop'] is None:
+                break
+            time.sleep(options['loop'])
+
+    def queue(self, weeks, members):
+        '''
+
+        Args:
+          weeks: ClosedWeeks.
+          members:
+
+        Returns:
+
+        '''
+        for closed in weeks:
+            self.stdout.write('Queued {count} mails of {week}'.format(
+                count=queue_week_mails(closed, members), week=closed.week))
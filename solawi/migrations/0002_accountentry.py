@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-17 01:23
+from __future__ import unicode_literals
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import solawi.validators
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solawi', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField(validators=[solawi.validators.validate_year])),
+                ('week', models.IntegerField(validators=[solawi.validators.validate_week])),
+                ('amount', models.IntegerField(validators=[solawi.validators.validate_asset])),
+            ],
+            options={
+                'verbose_name': 'account entry',
+                'verbose_name_plural': 'account entries',
+            },
+        ),
+        migrations.AlterField(
+            model_name='orderbasketproduct',
+            name='count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='assets',
+            field=models.IntegerField(blank=True, default=0, help_text='The sum of the not expired entries of the account', null=True, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddField(
+            model_name='accountentry',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='account_entries', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterIndexTogether(
+            name='accountentry',
+            index_together=set([('user', 'year', 'week')]),
+        ),
+    ]
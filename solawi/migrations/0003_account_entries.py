@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+import json
+from django.conf import settings
+from django.db import migrations
+
+
+def window_start():
+    '''
+    The (year, week) of the oldest week still accounted, in the %W week
+    numbers of the JSON accounts. Computed here rather than with the models,
+    so later changes to them do not change this migration.
+    '''
+    today = datetime.date.today()
+    start = today - datetime.timedelta(
+        today.weekday() + settings.WEEKS_TO_SAVE_ACCOUNTS * 7)
+    return start.year, int(start.strftime('%W'))
+
+
+def account_to_entries(apps, schema_editor):
+    '''
+    Move the not expired entries of the JSON accounts into AccountEntry rows
+    and set the assets to their sum.
+    '''
+    User = apps.get_model('solawi', 'User')
+    AccountEntry = apps.get_model('solawi', 'AccountEntry')
+    start = window_start()
+    entries = []
+    for user in User.objects.exclude(account__isnull=True).exclude(
+            account__in=['', '[]']).iterator():
+        assets = 0
+        for (year, week, amount) in json.loads(user.account):
+            if (year, week) >= start:
+                entries.append(AccountEntry(user_id=user.pk, year=year,
+                                            week=week, amount=amount))
+                assets += amount
+        User.objects.filter(pk=user.pk).update(assets=assets)
+    AccountEntry.objects.bulk_create(entries)
+
+
+def entries_to_account(apps, schema_editor):
+    ''' '''
+    User = apps.get_model('solawi', 'User')
+    AccountEntry = apps.get_model('solawi', 'AccountEntry')
+    accounts = {}
+    for (user_id, year, week, amount) in AccountEntry.objects.order_by(
+            'user', 'year', 'week').values_list(
+                'user', 'year', 'week', 'amount').iterator():
+        accounts.setdefault(user_id, []).append([year, week, amount])
+    for user_id, account in accounts.items():
+        User.objects.filter(pk=user_id).update(account=json.dumps(account))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solawi', '0002_accountentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(account_to_entries, entries_to_account),
+    ]
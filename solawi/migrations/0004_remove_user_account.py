@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solawi', '0003_account_entries'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='account',
+        ),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-17 01:25
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import solawi.validators
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solawi', '0004_remove_user_account'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Week',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField(validators=[solawi.validators.validate_year])),
+                ('week', models.IntegerField(validators=[solawi.validators.validate_week])),
+                ('monday', models.DateField(unique=True)),
+                ('sunday', models.DateField()),
+                ('iso', models.BooleanField(default=False, verbose_name='The week number agrees with the ISO week')),
+            ],
+            options={
+                'verbose_name': 'week',
+                'verbose_name_plural': 'weeks',
+                'ordering': ['monday'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='week',
+            unique_together=set([('year', 'week')]),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicates(apps, schema_editor):
+    '''
+    Merge the line items with the same basket and portion into one, so the
+    unique constraint can be added.
+    '''
+    OrderBasketProduct = apps.get_model('solawi', 'OrderBasketProduct')
+    duplicates = OrderBasketProduct.objects.order_by().values(
+        'basket', 'portion').annotate(
+            n=Count('id'), first=Min('id'), total=Sum('count')).filter(n__gt=1)
+    for duplicate in duplicates:
+        OrderBasketProduct.objects.filter(
+            pk=duplicate['first']).update(count=duplicate['total'])
+        OrderBasketProduct.objects.filter(
+            basket=duplicate['basket'], portion=duplicate['portion']).exclude(
+                pk=duplicate['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solawi', '0005_week'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-17 01:26
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solawi', '0006_merge_orderbasketproducts'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='orderbasketproduct',
+            unique_together=set([('basket', 'portion')]),
+        ),
+    ]
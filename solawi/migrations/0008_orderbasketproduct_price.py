@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-17 01:31
+from __future__ import unicode_literals
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solawi', '0007_orderbasketproduct_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderbasketproduct',
+            name='price',
+            field=models.FloatField(blank=True, help_text='The price of the portion when it was ordered.', null=True, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+def snapshot_prices(apps, schema_editor):
+    '''
+    Freeze the current portion prices into the existing line items.
+    '''
+    Portion = apps.get_model('solawi', 'Portion')
+    OrderBasketProduct = apps.get_model('solawi', 'OrderBasketProduct')
+    for (pk, price) in Portion.objects.values_list('pk', 'price').iterator():
+        OrderBasketProduct.objects.filter(
+            portion=pk, price__isnull=True).update(price=price)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solawi', '0008_orderbasketproduct_price'),
+    ]
+
+    operations = [
+        migrations.RunPython(snapshot_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-17 01:37
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solawi', '0009_snapshot_prices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BasketSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('count', models.IntegerField()),
+                ('price', models.FloatField(help_text='The price of one portion.')),
+                ('depot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='solawi.Depot')),
+                ('portion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='solawi.Portion')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='solawi.Product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='basket_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'basket snapshot',
+                'verbose_name_plural': 'basket snapshots',
+            },
+        ),
+        migrations.CreateModel(
+            name='ClosedWeek',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week', models.DateField(unique=True)),
+                ('closed', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'closed week',
+                'verbose_name_plural': 'closed weeks',
+                'ordering': ['week'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TotalSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('price', models.FloatField()),
+                ('depot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='solawi.Depot')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='solawi.Product')),
+                ('week', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='totals', to='solawi.ClosedWeek')),
+            ],
+            options={
+                'verbose_name': 'total snapshot',
+                'verbose_name_plural': 'total snapshots',
+            },
+        ),
+        migrations.AddField(
+            model_name='basketsnapshot',
+            name='week',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='baskets', to='solawi.ClosedWeek'),
+        ),
+        migrations.AlterIndexTogether(
+            name='basketsnapshot',
+            index_together=set([('week', 'depot', 'user')]),
+        ),
+    ]
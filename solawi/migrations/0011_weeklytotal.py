@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-17 01:39
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solawi', '0010_week_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyTotal',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('depot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='solawi.Depot')),
+                ('portion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='solawi.Portion')),
+            ],
+            options={
+                'verbose_name': 'weekly total',
+                'verbose_name_plural': 'weekly totals',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='weeklytotal',
+            unique_together=set([('week', 'depot', 'portion')]),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import Sum
+
+
+def fill_weekly_totals(apps, schema_editor):
+    '''
+    Aggregate the existing line items into the weekly totals.
+    '''
+    OrderBasketProduct = apps.get_model('solawi', 'OrderBasketProduct')
+    WeeklyTotal = apps.get_model('solawi', 'WeeklyTotal')
+    WeeklyTotal.objects.bulk_create([
+        WeeklyTotal(week=week, depot_id=depot, portion_id=portion,
+                    count=count)
+        for (week, depot, portion, count)
+        in OrderBasketProduct.objects.order_by().values_list(
+            'basket__week', 'basket__user__depot', 'portion').annotate(
+                count=Sum('count')).iterator()])
+
+
+def drop_weekly_totals(apps, schema_editor):
+    ''' '''
+    apps.get_model('solawi', 'WeeklyTotal').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solawi', '0011_weeklytotal'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_weekly_totals, drop_weekly_totals),
+    ]
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-17 01:51
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solawi', '0012_fill_weekly_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('supervisor', 'depot summary'), ('ordering', 'order summary'), ('member', 'member confirmation')], max_length=15)),
+                ('recipient', models.EmailField(max_length=254)),
+                ('subject', models.CharField(max_length=200)),
+                ('body', models.TextField()),
+                ('attachment_name', models.CharField(blank=True, max_length=100)),
+                ('attachment', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('sent', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('week', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mails', to='solawi.ClosedWeek')),
+            ],
+            options={
+                'verbose_name': 'outbox mail',
+                'verbose_name_plural': 'outbox mails',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='outboxmail',
+            unique_together=set([('week', 'kind', 'user')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='outboxmail',
+            index_together=set([('sent', 'attempts')]),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-17 01:55
+from __future__ import unicode_literals
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solawi', '0013_outboxmail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StandingOrder',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('add', 'module'), ('remove', 'de-order'), ('exchange', 'exchange')], default='add', max_length=10)),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('period', models.PositiveIntegerField(default=1, help_text='Apply every this many weeks.', validators=[django.core.validators.MinValueValidator(1)])),
+                ('start', models.DateField(help_text='A day of the first week.')),
+                ('end', models.DateField(blank=True, help_text='A day of the last week.', null=True)),
+                ('portion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='solawi.Portion')),
+                ('replacement', models.ForeignKey(blank=True, help_text='The portion to get in exchange.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='solawi.Portion')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='standing_orders', to=settings.AUTH_USER_MODEL)),
+                ('weeklybasket', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='standing_orders', to='solawi.WeeklyBasket')),
+            ],
+            options={
+                'verbose_name': 'standing order',
+                'verbose_name_plural': 'standing orders',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='standingorder',
+            index_together=set([('start', 'end')]),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-17 02:05
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solawi', '0014_standingorder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBasket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week', models.DateField()),
+                ('edited_weekly_basket', models.BooleanField(default=False)),
+                ('lines', models.BinaryField(blank=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'archived basket',
+                'verbose_name_plural': 'archived baskets',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='archivedbasket',
+            unique_together=set([('week', 'user')]),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-17 02:32
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def mark_queued_weeks(apps, schema_editor):
+    '''
+    The weeks with mails in the outbox were queued when their first mail
+    was created.
+    '''
+    ClosedWeek = apps.get_model('solawi', 'ClosedWeek')
+    for (pk, queued) in ClosedWeek.objects.filter(
+            mails__isnull=False).values_list('pk').annotate(
+                queued=Min('mails__created')):
+        ClosedWeek.objects.filter(pk=pk).update(mails_queued=queued)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solawi', '0015_archivedbasket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='closedweek',
+            name='mails_queued',
+            field=models.DateTimeField(blank=True, help_text='When the mails about the week were queued, even if there were none.', null=True),
+        ),
+        migrations.RunPython(mark_queued_weeks, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,38 @@
+from collections import Counter
 import datetime
+import math
+import random
+import struct
+import time
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 from django.core import validators
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import (
+    IntegrityError,
+    OperationalError,
+    connections,
+    models,
+    transaction,
+)
+from django.db.models import (
+    Case,
+    ExpressionWrapper,
+    F,
+    FloatField,
+    IntegerField,
+    Q,
+    Sum,
+    Value,
+    When,
+)
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
-from solawi.validators import portion_account_validate
+from solawi.baskets import apply_standing_orders
+from solawi.validators import validate_asset, validate_week, validate_year
 from django.utils.translation import ugettext_lazy as _
-import json
+from solawi import caching
 from solawi import utils
 
 
@@ -24,11 +48,9 @@ class User(AbstractUser):
                                      related_name='members', blank=True,
                                      null=True)
     assets = models.IntegerField(null=True, blank=True, default=0,
-                                 validators=[validators.MinValueValidator(0)])
-    account = models.TextField(null=True, blank=True, default='[]',
-                               help_text=_('Containing the JSON array of '
-                                           'this users gained potentials'),
-                               validators=[portion_account_validate])
+                                 validators=[validators.MinValueValidator(0)],
+                                 help_text=_('The sum of the not expired '
+                                             'entries of the account'))
 
     class Meta:
         ''' '''
@@ -36,28 +58,216 @@ class User(AbstractUser):
         verbose_name_plural = _('users')
 
     def __str__(self):
-        if self.first_name == '' and self.last_name == '':
-            name = self.username
-        else:
-            name = self.first_name + ' ' + self.last_name
+        name = utils.member_name(self.first_name, self.last_name,
+                                 self.username)
         if self.depot is None:
             return _('{name}').format(name=name)
         else:
             return _('{name} ({depot})').format(name=name,
                                                 depot=self.depot.name)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        ''' '''
+        instance = super().from_db(db, field_names, values)
+        if 'depot_id' in instance.__dict__:
+            instance._loaded_depot = instance.depot_id
+        return instance
+
     def clean(self):
         ''' '''
         super().clean()
-        if self.is_supervisor:
-            if self.depot is None:
-                raise ValidationError(_('A Member has to have an depot.'))
-        if self.is_member:
-            if self.depot is None:
-                raise ValidationError(_('A Member has to have an depot.'))
-            if self.weeklybasket is None:
-                raise ValidationError(_('A Member has to have an '
-                                        'weekly basket.'))
+        error = member_assignment_error(self.depot_id, self.weeklybasket_id,
+                                        self.is_member, self.is_supervisor)
+        if error is not None:
+            raise ValidationError(error)
+
+    def rebuild_assets(self):
+        '''
+        Prune the expired account entries and recompute the assets with a
+        single aggregate query.
+
+        Returns:
+          The new assets.
+
+        '''
+        with transaction.atomic():
+            self.account_entries.all().prune()
+            self.assets = self.account_entries.aggregate(
+                total=Sum('amount'))['total'] or 0
+            User.objects.filter(pk=self.pk).update(assets=self.assets)
+        return self.assets
+
+
+def member_assignment_error(depot, weeklybasket, is_member, is_supervisor):
+    '''
+    The invariants of User.clean, also checked for bulk assignments which
+    do not load the users.
+
+    Args:
+      depot: The depot id or None.
+      weeklybasket: The weekly basket id or None.
+      is_member:
+      is_supervisor:
+
+    Returns:
+      The error message, or None if the values are valid.
+
+    '''
+    if (is_supervisor or is_member) and depot is None:
+        return _('A Member has to have an depot.')
+    if is_member and weeklybasket is None:
+        return _('A Member has to have an weekly basket.')
+    return None
+
+
+def account_window_start(date=None):
+    '''
+
+    Args:
+      date: (Default value = None)
+
+    Returns:
+      The tuple (year, week) of the oldest week which is still accounted.
+
+    '''
+    year, week = utils.year_week(date)
+    valid_days = settings.WEEKS_TO_SAVE_ACCOUNTS * 7
+    start = utils.date_from_week(year, week) - datetime.timedelta(valid_days)
+    return utils.year_week(start)
+
+
+def bulk_update_assets(assets, batch_size=250):
+    '''
+    Write the assets of many users with one UPDATE ... CASE per batch and
+    without calling User.save().
+
+    Args:
+      assets: A dict mapping user ids to the new assets or an expression.
+      batch_size: (Default value = 250)
+
+    Returns:
+      The number of updated rows.
+
+    '''
+    updated = 0
+    user_ids = list(assets)
+    for i in range(0, len(user_ids), batch_size):
+        batch = user_ids[i:i + batch_size]
+        whens = [When(pk=user_id, then=assets[user_id]) for user_id in batch]
+        updated += User.objects.filter(pk__in=batch).update(
+            assets=Case(*whens, output_field=IntegerField()))
+    if updated:
+        caching.bump('members')
+    return updated
+
+
+def rebuild_all_assets(date=None, batch_size=250):
+    '''
+    Recompute the rolling window assets of all users at once. The sums are
+    computed by a single grouped query over the valid entries and only the
+    users whose assets changed are written.
+
+    Args:
+      date: (Default value = None)
+      batch_size: (Default value = 250)
+
+    Returns:
+      The number of users whose assets changed.
+
+    '''
+    with transaction.atomic():
+        totals = dict(AccountEntry.objects.valid(date).order_by().values_list(
+            'user').annotate(total=Sum('amount')).iterator())
+        changed = {}
+        for user_id, assets in User.objects.values_list(
+                'pk', 'assets').iterator():
+            total = totals.get(user_id, 0)
+            if assets != total:
+                changed[user_id] = Value(total)
+        deleted, _rows = AccountEntry.objects.expired(date).delete()
+        updated = bulk_update_assets(changed, batch_size)
+        if deleted and not updated:
+            caching.bump('members')
+        return updated
+
+
+class AccountEntryQuerySet(models.QuerySet):
+    ''' '''
+
+    def _window_filter(self, date=None):
+        year, week = account_window_start(date)
+        return Q(year__gt=year) | Q(year=year, week__gte=week)
+
+    def valid(self, date=None):
+        '''
+
+        Args:
+          date: (Default value = None)
+
+        Returns:
+
+        '''
+        return self.filter(self._window_filter(date))
+
+    def expired(self, date=None):
+        '''
+
+        Args:
+          date: (Default value = None)
+
+        Returns:
+
+        '''
+        return self.exclude(self._window_filter(date))
+
+    def prune(self, date=None):
+        '''
+        Delete the expired entries and take their amounts off the assets of
+        their users.
+
+        Args:
+          date: (Default value = None)
+
+        Returns:
+          The number of deleted entries.
+
+        '''
+        expired = self.expired(date)
+        with transaction.atomic():
+            totals = expired.order_by().values_list('user').annotate(
+                total=Sum('amount'))
+            bulk_update_assets(
+                {user_id: F('assets') - Value(total)
+                 for user_id, total in totals.iterator()})
+            # bulk_update_assets has bumped the members already.
+            deleted, _rows = expired.delete()
+        return deleted
+
+
+class AccountEntry(models.Model):
+    '''
+    One entry of the account of an user. The assets of the user are the sum
+    of its entries and are maintained incrementally on every save.
+    '''
+    user = models.ForeignKey('User', on_delete=models.CASCADE,
+                             related_name='account_entries')
+    year = models.IntegerField(validators=[validate_year])
+    week = models.IntegerField(validators=[validate_week])
+    amount = models.IntegerField(validators=[validate_asset])
+
+    objects = AccountEntryQuerySet.as_manager()
+
+    class Meta:
+        ''' '''
+        verbose_name = _('account entry')
+        verbose_name_plural = _('account entries')
+        index_together = ('user', 'year', 'week')
+
+    def __str__(self):
+        return '{amount} for {user_id} in {year}-{week}'.format(
+            amount=self.amount, user_id=self.user_id, year=self.year,
+            week=self.week)
 
     def save(self, *args, **kwargs):
         '''
@@ -69,15 +279,56 @@ class User(AbstractUser):
         Returns:
 
         '''
-        if self.account:
-            self.assets = 0
-            this_week = utils.date_from_week()
-            valid_days = settings.WEEKS_TO_SAVE_ACCOUNTS * 7
-            for (year, week, asset) in json.loads(self.account):
-                date_delta = this_week - utils.date_from_week(year, week)
-                if date_delta.days <= valid_days:
-                    self.assets += asset
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            delta = self.amount
+            if self.pk is not None:
+                old = AccountEntry.objects.filter(pk=self.pk).values_list(
+                    'amount', flat=True).first()
+                delta -= old or 0
+            super().save(*args, **kwargs)
+            if delta:
+                User.objects.filter(pk=self.user_id).update(
+                    assets=F('assets') + delta)
+            AccountEntry.objects.filter(user_id=self.user_id).prune()
+
+    def delete(self, *args, **kwargs):
+        '''
+
+        Args:
+          *args:
+          **kwargs:
+
+        Returns:
+
+        '''
+        with transaction.atomic():
+            User.objects.filter(pk=self.user_id).update(
+                assets=F('assets') - self.amount)
+            caching.bump('members')
+            return super().delete(*args, **kwargs)
+
+
+class Week(models.Model):
+    '''
+    The week calendar of utils.calendar_year as a table to join against.
+    Filled by the fill_weeks command.
+    '''
+    year = models.IntegerField(validators=[validate_year])
+    week = models.IntegerField(validators=[validate_week])
+    monday = models.DateField(unique=True)
+    sunday = models.DateField()
+    iso = models.BooleanField(
+        _('The week number agrees with the ISO week'), default=False)
+
+    class Meta:
+        ''' '''
+        verbose_name = _('week')
+        verbose_name_plural = _('weeks')
+        unique_together = ('year', 'week')
+        ordering = ['monday']
+
+    def __str__(self):
+        return '{year}-{week}'.format(year=self.year, week=self.week)
 
 
 class Product(models.Model):
@@ -98,6 +349,34 @@ class Product(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        ''' '''
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_price = instance.__dict__.get('price')
+        return instance
+
+    def save(self, *args, **kwargs):
+        '''
+        If the price changed, reprice all portions with a single UPDATE.
+        The line items keep the price they were ordered at.
+
+        Args:
+          *args:
+          **kwargs:
+
+        Returns:
+
+        '''
+        price_changed = getattr(self, '_loaded_price', None) != self.price
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if price_changed:
+                self.portions.update(price=ExpressionWrapper(
+                    F('quantity') * Value(self.price),
+                    output_field=FloatField()))
+        self._loaded_price = self.price
+
 
 class Portion(models.Model):
     ''' '''
@@ -174,14 +453,110 @@ class OrderBasketProduct(models.Model):
     portion = models.ForeignKey('Portion')
     basket = models.ForeignKey('OrderBasket')
     count = models.IntegerField(default=0)
+    price = models.FloatField(
+        validators=[validators.MinValueValidator(0)], null=True, blank=True,
+        help_text=_('The price of the portion when it was ordered.'))
+
+    class Meta:
+        ''' '''
+        unique_together = ('basket', 'portion')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        ''' '''
+        instance = super().from_db(db, field_names, values)
+        instance._loaded = (instance.__dict__.get('basket_id'),
+                            instance.__dict__.get('portion_id'),
+                            instance.__dict__.get('count'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        '''
+
+        Args:
+          *args:
+          **kwargs:
+
+        Returns:
+
+        '''
+        if self.price is None:
+            self.price = self.portion.price
+        super().save(*args, **kwargs)
 
     def __str__(self):
-        week = self.basket.week.strftime('%W')
-        year = self.basket.week.year
+        year, week = utils.year_week(self.basket.week)
         return '{count} of {portion} for {user} in {year}-{week}'.format(
             count=self.count, portion=self.portion, user=self.basket.user,
             year=year, week=week)
 
+
+def run_in_transaction(function, attempts=None):
+    '''
+    Run the function in a transaction and run it again if it collided with
+    a concurrent transaction, which shows as an IntegrityError of a unique
+    constraint or, on SQLite, as a locked database. Inside an outer
+    transaction the function runs once, as only the outer one could be
+    repeated.
+
+    Args:
+      function: A function without arguments.
+      attempts: (Default value = None, settings.ORDER_WRITE_ATTEMPTS)
+
+    Returns:
+      The result of the function.
+
+    '''
+    if attempts is None:
+        attempts = settings.ORDER_WRITE_ATTEMPTS
+    if transaction.get_connection().in_atomic_block:
+        attempts = 1
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                return function()
+        except (IntegrityError, OperationalError) as error:
+            if attempt + 1 == attempts or (
+                    isinstance(error, OperationalError) and
+                    'locked' not in str(error)):
+                raise
+        time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+
+
+class OrderBasketQuerySet(models.QuerySet):
+    ''' '''
+
+    def lock(self, user, week):
+        '''
+        Get or create the order basket of a member in a week and lock its
+        row until the end of the transaction, so concurrent writes to the
+        basket run one after the other. A concurrent creation of the same
+        basket is caught by get_or_create. A new basket gets the standing
+        orders of the member.
+
+        Args:
+          user:
+          week: A day of the week.
+
+        Returns:
+          The locked OrderBasket.
+
+        '''
+        monday = utils.get_moday(week)
+        # SQLite ignores select_for_update. The no-op UPDATE takes its write
+        # lock before anything is read, waiting for the busy timeout,
+        # instead of failing when a read transaction has to become a write
+        # transaction.
+        self.filter(user=user, week=monday).update(
+            edited_weekly_basket=F('edited_weekly_basket'))
+        basket, created = self.select_for_update().get_or_create(
+            user=user, week=monday)
+        basket.user = user
+        if created:
+            basket.apply_standing_orders()
+        return basket
+
+
 class OrderBasket(models.Model):
     ''' '''
     week = models.DateField()
@@ -191,12 +566,22 @@ class OrderBasket(models.Model):
     edited_weekly_basket = models.BooleanField(
         _('Has edited the weekly basket for this week'), default=False)
 
+    objects = OrderBasketQuerySet.as_manager()
+
     class Meta:
         ''' '''
         verbose_name = _('order basket')
         verbose_name_plural = _('order baskets')
         unique_together = ('week', 'user')
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        ''' '''
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_key = (instance.__dict__.get('week'),
+                                instance.__dict__.get('user_id'))
+        return instance
+
     def clean(self):
         ''' '''
         super().clean()
@@ -204,6 +589,8 @@ class OrderBasket(models.Model):
 
     def save(self, *args, **kwargs):
         '''
+        Moves the line items in the weekly totals if the week or the user
+        changed.
 
         Args:
           *args:
@@ -214,11 +601,877 @@ class OrderBasket(models.Model):
         '''
         # Set every date on Monday!
         self.week = utils.get_moday(self.week)
-        super().save(*args, **kwargs)
+        loaded_key = getattr(self, '_loaded_key', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            key = (self.week, self.user_id)
+            if loaded_key is not None and None not in loaded_key and \
+                    loaded_key != key:
+                old_key = (loaded_key[0], _depot_of(loaded_key[1]))
+                move_weekly_totals(
+                    self.orderbasketproduct_set.all(),
+                    old_key=lambda week, depot: old_key,
+                    new_key=lambda week, depot: (week, depot))
+                caching.bump('orders', loaded_key[1], loaded_key[0])
+            caching.bump('orders', self.user_id, self.week)
+            # The basket decides if the member gets the weekly basket.
+            caching.bump('totals')
+        self._loaded_key = key
+
+    def _create_line_items(self, counts):
+        '''
+        Bulk insert new line items, which snapshot the current price of
+        their portion.
+
+        Args:
+          counts: A dict mapping portion ids to their count.
+
+        Returns:
+
+        '''
+        if not counts:
+            return
+        prices = dict(Portion.objects.filter(pk__in=counts).values_list(
+            'pk', 'price'))
+        OrderBasketProduct.objects.bulk_create([
+            OrderBasketProduct(basket=self, portion_id=portion_id,
+                               count=count, price=prices[portion_id])
+            for portion_id, count in counts.items()])
+        self._add_to_weekly_totals(counts)
+
+    def _add_to_weekly_totals(self, deltas):
+        '''
+        Also invalidates the cached order fragments of the member.
+
+        Args:
+          deltas: A dict mapping portion ids to the change of their count.
+
+        Returns:
+
+        '''
+        user = self.__dict__.get('_user_cache')
+        if user is not None and user.pk == self.user_id:
+            depot = user.depot_id
+        else:
+            depot = _depot_of(self.user_id)
+        add_to_weekly_totals({(self.week, depot, portion_id): delta
+                              for portion_id, delta in deltas.items()})
+        caching.bump('orders', self.user_id, self.week)
+
+    def apply_standing_orders(self):
+        '''
+        Fill a new basket with the standing orders of its member in the
+        week.
+        '''
+        user = self.user
+        basket = user.weeklybasket_id if user.is_member else None
+        changes, users = standing_order_changes(self.week, {user.pk: basket})
+        if user.pk not in changes:
+            return
+        weekly = weekly_basket_counters([basket]).get(basket, Counter())
+        edited, lines = apply_standing_orders(weekly, changes[user.pk])
+        if edited:
+            self.edited_weekly_basket = True
+            self.save(update_fields=['edited_weekly_basket'])
+        self._create_line_items(lines)
+
+    def add_portions(self, counts):
+        '''
+        Add portions to this basket with a constant number of queries: one
+        to find the existing line items, one for the prices and one bulk
+        insert of the new ones and one UPDATE incrementing the existing
+        ones.
+
+        Args:
+          counts: A Counter mapping portion ids to the number to add.
+
+        Returns:
+
+        '''
+        counts = {portion_id: count for portion_id, count in counts.items()
+                  if count}
+        if not counts:
+            return
+        with transaction.atomic():
+            existing = set(OrderBasketProduct.objects.filter(
+                basket=self, portion__in=counts).values_list(
+                    'portion', flat=True))
+            self._create_line_items({
+                portion_id: count for portion_id, count in counts.items()
+                if portion_id not in existing})
+            if existing:
+                whens = [When(portion=portion_id,
+                              then=Value(counts[portion_id]))
+                         for portion_id in existing]
+                OrderBasketProduct.objects.filter(
+                    basket=self, portion__in=existing).update(
+                        count=F('count') + Case(
+                            *whens, default=Value(0),
+                            output_field=IntegerField()))
+                self._add_to_weekly_totals({portion_id: counts[portion_id]
+                                            for portion_id in existing})
+
+    def set_portions(self, counts):
+        '''
+        Replace the line items of this basket with a constant number of
+        queries: one DELETE of the dropped portions, one to find the
+        remaining line items, the insert of the new ones and one UPDATE of
+        the changed counts, plus the updates of the weekly totals.
+
+        Args:
+          counts: A Counter mapping portion ids to their new count.
+
+        Returns:
+
+        '''
+        counts = {portion_id: count for portion_id, count in counts.items()
+                  if count}
+        with transaction.atomic():
+            delete_line_items(OrderBasketProduct.objects.filter(
+                basket=self).exclude(portion__in=counts))
+            existing = dict(OrderBasketProduct.objects.filter(
+                basket=self).values_list('portion', 'count'))
+            self._create_line_items({
+                portion_id: count for portion_id, count in counts.items()
+                if portion_id not in existing})
+            changed = {portion_id: counts[portion_id]
+                       for portion_id, count in existing.items()
+                       if counts[portion_id] != count}
+            if changed:
+                whens = [When(portion=portion_id, then=Value(count))
+                         for portion_id, count in changed.items()]
+                OrderBasketProduct.objects.filter(
+                    basket=self, portion__in=changed).update(
+                        count=Case(*whens, output_field=IntegerField()))
+                self._add_to_weekly_totals({
+                    portion_id: count - existing[portion_id]
+                    for portion_id, count in changed.items()})
 
     def __str__(self):
         ostr = ', '.join([str(i) for i in self.contents.all()])
-        week = self.week.strftime('%W')
-        year = self.week.year
+        year, week = utils.year_week(self.week)
         return _('{year}-{week} by {user}: {contents}').format(
             year=year, week=week, user=self.user, contents=ostr)
+
+
+class StandingOrderQuerySet(models.QuerySet):
+    ''' '''
+
+    def active(self, week):
+        '''
+
+        Args:
+          week: A day of the week.
+
+        Returns:
+          The list of the standing orders applying in the week, ordered by
+          their creation. The period is checked on the fetched rows.
+
+        '''
+        monday = utils.get_moday(week)
+        return [order for order in self.filter(
+            Q(end__isnull=True) | Q(end__gte=monday),
+            start__lte=monday).order_by('pk')
+                if order.applies_to(monday)]
+
+
+class StandingOrder(models.Model):
+    '''
+    A regular change of the baskets of a member, or of all members of a
+    weekly basket: a module added on top, a portion de-ordered or a
+    portion exchanged for another, every period weeks from start until the
+    optional end. The standing orders are applied once, when the order
+    basket of a week gets created, see materialize_week.
+    '''
+    ADD = 'add'
+    REMOVE = 'remove'
+    EXCHANGE = 'exchange'
+    KINDS = (
+        (ADD, _('module')),
+        (REMOVE, _('de-order')),
+        (EXCHANGE, _('exchange')),
+    )
+    user = models.ForeignKey('User', on_delete=models.CASCADE, null=True,
+                             blank=True, related_name='standing_orders')
+    weeklybasket = models.ForeignKey('WeeklyBasket', on_delete=models.CASCADE,
+                                     null=True, blank=True,
+                                     related_name='standing_orders')
+    kind = models.CharField(max_length=10, choices=KINDS, default=ADD)
+    portion = models.ForeignKey('Portion', on_delete=models.CASCADE,
+                                related_name='+')
+    replacement = models.ForeignKey(
+        'Portion', on_delete=models.CASCADE, null=True, blank=True,
+        related_name='+', help_text=_('The portion to get in exchange.'))
+    count = models.PositiveIntegerField(default=1)
+    period = models.PositiveIntegerField(
+        default=1, validators=[validators.MinValueValidator(1)],
+        help_text=_('Apply every this many weeks.'))
+    start = models.DateField(help_text=_('A day of the first week.'))
+    end = models.DateField(null=True, blank=True,
+                           help_text=_('A day of the last week.'))
+
+    objects = StandingOrderQuerySet.as_manager()
+
+    class Meta:
+        ''' '''
+        verbose_name = _('standing order')
+        verbose_name_plural = _('standing orders')
+        index_together = ('start', 'end')
+
+    def __str__(self):
+        return '{kind} {count} of {portion} every {period} weeks'.format(
+            kind=self.kind, count=self.count, portion=self.portion_id,
+            period=self.period)
+
+    def clean(self):
+        ''' '''
+        super().clean()
+        if (self.user_id is None) == (self.weeklybasket_id is None):
+            raise ValidationError(_('A standing order belongs either to a '
+                                    'member or to a weekly basket.'))
+        if (self.kind == self.EXCHANGE) != (self.replacement_id is not None):
+            raise ValidationError(_('Only an exchange has a replacement.'))
+        if self.end is not None and self.start is not None and \
+                self.end < self.start:
+            raise ValidationError(_('The standing order ends before it '
+                                    'starts.'))
+
+    def save(self, *args, **kwargs):
+        '''
+
+        Args:
+          *args:
+          **kwargs:
+
+        Returns:
+
+        '''
+        self.start = utils.get_moday(self.start)
+        if self.end is not None:
+            self.end = utils.get_moday(self.end)
+        super().save(*args, **kwargs)
+
+    def applies_to(self, week):
+        '''
+
+        Args:
+          week: A day of the week.
+
+        Returns:
+          If the standing order applies in the week.
+
+        '''
+        monday = utils.get_moday(week)
+        start = utils.get_moday(self.start)
+        if monday < start or (self.end is not None and
+                              monday > utils.get_moday(self.end)):
+            return False
+        return (monday - start).days // 7 % self.period == 0
+
+    def change(self):
+        '''
+        The (removed portion id, added portion id, count) for
+        baskets.apply_standing_orders.
+        '''
+        if self.kind == self.ADD:
+            return (None, self.portion_id, self.count)
+        if self.kind == self.REMOVE:
+            return (self.portion_id, None, self.count)
+        return (self.portion_id, self.replacement_id, self.count)
+
+
+def weekly_basket_counters(baskets):
+    '''
+
+    Args:
+      baskets: Iterable of weekly basket ids, may contain None.
+
+    Returns:
+      A dict mapping the weekly basket ids to the Counter of their portion
+      ids.
+
+    '''
+    counters = {}
+    for (basket, portion) in WeeklyBasket.contents.through.objects.filter(
+            weeklybasket__in=[basket for basket in baskets
+                              if basket is not None]).values_list(
+                                  'weeklybasket', 'portion'):
+        counters.setdefault(basket, Counter())[portion] += 1
+    return counters
+
+
+def standing_order_changes(week, users):
+    '''
+    The standing orders of members in a week, with two queries.
+
+    Args:
+      week: A day of the week.
+      users: A dict mapping the user ids to the ids of the weekly baskets
+        they get, None for users who are no paying members, or None for
+        all users with standing orders.
+
+    Returns:
+      A tuple of a dict mapping the user ids to the list of their changes
+      for baskets.apply_standing_orders, and the dict mapping the user ids
+      to their weekly basket ids like users, which includes all members of
+      the weekly baskets with standing orders if users was None.
+
+    '''
+    orders = StandingOrder.objects.all()
+    if users is not None:
+        orders = orders.filter(
+            Q(user__in=list(users)) |
+            Q(weeklybasket__in={basket for basket in users.values()
+                                if basket is not None}))
+    orders = orders.active(week)
+    if users is None:
+        baskets = {order.weeklybasket_id for order in orders
+                   if order.weeklybasket_id is not None}
+        users = {user: basket if is_member else None
+                 for (user, basket, is_member) in User.objects.filter(
+                     Q(pk__in={order.user_id for order in orders
+                               if order.user_id is not None}) |
+                     Q(is_member=True, weeklybasket__in=baskets)).values_list(
+                         'pk', 'weeklybasket', 'is_member')}
+    by_basket = {}
+    changes = {}
+    for order in orders:
+        if order.user_id is not None:
+            if order.user_id in users:
+                changes.setdefault(order.user_id, []).append(order.change())
+        else:
+            by_basket.setdefault(order.weeklybasket_id, []).append(
+                order.change())
+    for user, basket in users.items():
+        if basket in by_basket:
+            # The changes of the weekly basket come before those of the
+            # member.
+            changes[user] = by_basket[basket] + changes.get(user, [])
+    return changes, users
+
+
+class WeeklyTotal(models.Model):
+    '''
+    The number of a portion ordered by the members of a depot in a week,
+    summed over the line items of their order baskets. Kept current by
+    F() increments on every write of line items, see
+    add_to_weekly_totals, and reconciled by the rebuild_totals command.
+    '''
+    week = models.DateField()
+    depot = models.ForeignKey('Depot', on_delete=models.CASCADE, null=True,
+                              blank=True, related_name='+')
+    portion = models.ForeignKey('Portion', on_delete=models.CASCADE,
+                                related_name='+')
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        ''' '''
+        verbose_name = _('weekly total')
+        verbose_name_plural = _('weekly totals')
+        unique_together = ('week', 'depot', 'portion')
+
+    def __str__(self):
+        return '{count} of {portion} for {depot} in {week}'.format(
+            count=self.count, portion=self.portion_id, depot=self.depot_id,
+            week=self.week)
+
+
+def _depot_of(user_id):
+    ''' '''
+    return User.objects.filter(pk=user_id).values_list(
+        'depot', flat=True).first()
+
+
+def add_to_weekly_totals(deltas):
+    '''
+    Increment the weekly totals with one UPDATE per week and depot and one
+    insert of the missing rows.
+
+    Args:
+      deltas: A dict mapping (week, depot id, portion id) to the change of
+        the count.
+
+    Returns:
+
+    '''
+    groups = {}
+    for (week, depot, portion), delta in deltas.items():
+        if delta:
+            groups.setdefault((week, depot), {})[portion] = delta
+    missing = []
+    with transaction.atomic():
+        for (week, depot), portions in groups.items():
+            rows = WeeklyTotal.objects.filter(week=week, depot=depot,
+                                              portion__in=portions)
+            existing = set(rows.values_list('portion', flat=True))
+            if existing:
+                whens = [When(portion=portion, then=Value(portions[portion]))
+                         for portion in existing]
+                rows.update(count=F('count') + Case(
+                    *whens, default=Value(0), output_field=IntegerField()))
+            missing.extend(
+                WeeklyTotal(week=week, depot_id=depot, portion_id=portion,
+                            count=delta)
+                for portion, delta in portions.items()
+                if portion not in existing)
+        WeeklyTotal.objects.bulk_create(missing)
+    if groups:
+        caching.bump('totals')
+
+
+def delete_without_signals(queryset):
+    '''
+    Delete the rows of a queryset with one DELETE, without loading them,
+    without their delete signals and without cascading. Rows of other
+    models referring to them have to be deleted first.
+
+    Args:
+      queryset:
+
+    Returns:
+      The number of deleted rows.
+
+    '''
+    connection = connections[queryset.db]
+    qn = connection.ops.quote_name
+    pk = qn(queryset.model._meta.pk.column)
+    sql, params = queryset.order_by().values('pk').query.get_compiler(
+        queryset.db).as_sql()
+    # The ids are selected from a derived table, as MySQL can not delete
+    # from a table its subquery reads.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'DELETE FROM {table} WHERE {pk} IN (SELECT {pk} FROM ({sql}) '
+            '{ids})'.format(table=qn(queryset.model._meta.db_table), pk=pk,
+                            sql=sql, ids=qn('ids')), params)
+        return cursor.rowcount
+
+
+def delete_line_items(line_items):
+    '''
+    Delete line items and take them off the weekly totals with a constant
+    number of queries, instead of a post_delete signal per line item. Also
+    invalidates the cached order fragments of their members.
+
+    Args:
+      line_items: A queryset of OrderBasketProducts.
+
+    Returns:
+      The number of deleted line items.
+
+    '''
+    with transaction.atomic():
+        deltas = Counter()
+        for (week, user, depot, portion, count) in \
+                line_items.order_by().values_list(
+                    'basket__week', 'basket__user', 'basket__user__depot',
+                    'portion').annotate(count=Sum('count')):
+            deltas[(week, depot, portion)] -= count
+            caching.bump('orders', user, week)
+        if not deltas:
+            return 0
+        deleted = delete_without_signals(line_items)
+        add_to_weekly_totals(deltas)
+    return deleted
+
+
+def move_weekly_totals(line_items, old_key, new_key):
+    '''
+    Move line items from one week and depot to another in the weekly
+    totals.
+
+    Args:
+      line_items: A queryset of OrderBasketProducts.
+      old_key: A function mapping the (week, depot id) the line items are
+        counted in to the one they were counted in before.
+      new_key: A function mapping the (week, depot id) to the one they are
+        counted in now.
+
+    Returns:
+
+    '''
+    deltas = Counter()
+    for (week, depot, portion, count) in line_items.order_by().values_list(
+            'basket__week', 'basket__user__depot', 'portion').annotate(
+                count=Sum('count')):
+        deltas[old_key(week, depot) + (portion,)] -= count
+        deltas[new_key(week, depot) + (portion,)] += count
+    add_to_weekly_totals(deltas)
+
+
+def weekly_totals_from_line_items(weeks=None):
+    '''
+
+    Args:
+      weeks: A list of Mondays. (Default value = None, all weeks)
+
+    Returns:
+      A dict mapping (week, depot id, portion id) to the count, aggregated
+      from the line items with one grouped query.
+
+    '''
+    line_items = OrderBasketProduct.objects.all()
+    if weeks is not None:
+        line_items = line_items.filter(basket__week__in=weeks)
+    return {(week, depot, portion): count
+            for (week, depot, portion, count) in line_items.order_by(
+                ).values_list('basket__week', 'basket__user__depot',
+                              'portion').annotate(
+                                  count=Sum('count')).iterator()
+            if count}
+
+
+def rebuild_weekly_totals(weeks=None, fix=True):
+    '''
+    Compare the weekly totals with the aggregation of the line items and
+    rewrite the drifted rows. The totals of archived weeks are kept as they
+    are, their line items are no longer in the order basket tables.
+
+    Args:
+      weeks: A list of Mondays. (Default value = None, all weeks)
+      fix: Write the differences. (Default value = True)
+
+    Returns:
+      A dict mapping the drifted (week, depot id, portion id) to the tuple
+      (stored count, actual count).
+
+    '''
+    with transaction.atomic():
+        actual = weekly_totals_from_line_items(weeks)
+        stored_rows = WeeklyTotal.objects.all()
+        archived = ArchivedBasket.objects.all()
+        if weeks is not None:
+            stored_rows = stored_rows.filter(week__in=weeks)
+            archived = archived.filter(week__in=weeks)
+        stored_rows = stored_rows.exclude(
+            week__in=archived.values('week').distinct())
+        stored = {(week, depot, portion): count
+                  for (week, depot, portion, count) in stored_rows.values_list(
+                      'week', 'depot', 'portion', 'count').iterator()}
+        drift = {key: (stored.get(key, 0), actual.get(key, 0))
+                 for key in set(stored) | set(actual)
+                 if stored.get(key, 0) != actual.get(key, 0)}
+        if fix and drift:
+            add_to_weekly_totals({key: count - stored_count
+                                  for key, (stored_count, count)
+                                  in drift.items()})
+            stored_rows.filter(count=0).delete()
+    return drift
+
+
+class ClosedWeek(models.Model):
+    '''
+    A week whose orders are closed. The final baskets of the members and
+    the totals per depot and product are frozen into BasketSnapshot and
+    TotalSnapshot rows by snapshots.close_week and never change afterwards.
+    '''
+    week = models.DateField(unique=True)
+    closed = models.DateTimeField(auto_now_add=True)
+    mails_queued = models.DateTimeField(
+        null=True, blank=True,
+        help_text=_('When the mails about the week were queued, even if '
+                    'there were none.'))
+
+    class Meta:
+        ''' '''
+        verbose_name = _('closed week')
+        verbose_name_plural = _('closed weeks')
+        ordering = ['week']
+
+    def __str__(self):
+        year, week = utils.year_week(self.week)
+        return '{year}-{week}'.format(year=year, week=week)
+
+
+class BasketSnapshot(models.Model):
+    '''
+    A portion a member got in a closed week. The depot, product, quantity
+    and price are copied, so later changes of the member or the portion do
+    not alter the past.
+    '''
+    week = models.ForeignKey('ClosedWeek', on_delete=models.CASCADE,
+                             related_name='baskets')
+    user = models.ForeignKey('User', on_delete=models.CASCADE,
+                             related_name='basket_snapshots')
+    depot = models.ForeignKey('Depot', on_delete=models.SET_NULL, null=True,
+                              blank=True, related_name='+')
+    portion = models.ForeignKey('Portion', on_delete=models.SET_NULL,
+                                null=True, blank=True, related_name='+')
+    product = models.ForeignKey('Product', on_delete=models.CASCADE,
+                                related_name='+')
+    quantity = models.IntegerField()
+    count = models.IntegerField()
+    price = models.FloatField(help_text=_('The price of one portion.'))
+
+    class Meta:
+        ''' '''
+        verbose_name = _('basket snapshot')
+        verbose_name_plural = _('basket snapshots')
+        index_together = ('week', 'depot', 'user')
+
+    def __str__(self):
+        return '{count} x {quantity} of {product} for {user} in {week}'.format(
+            count=self.count, quantity=self.quantity,
+            product=self.product_id, user=self.user_id, week=self.week_id)
+
+
+class TotalSnapshot(models.Model):
+    '''
+    The quantity and price of a product delivered to a depot in a closed
+    week.
+    '''
+    week = models.ForeignKey('ClosedWeek', on_delete=models.CASCADE,
+                             related_name='totals')
+    depot = models.ForeignKey('Depot', on_delete=models.SET_NULL, null=True,
+                              blank=True, related_name='+')
+    product = models.ForeignKey('Product', on_delete=models.CASCADE,
+                                related_name='+')
+    quantity = models.IntegerField()
+    price = models.FloatField()
+
+    class Meta:
+        ''' '''
+        verbose_name = _('total snapshot')
+        verbose_name_plural = _('total snapshots')
+
+    def __str__(self):
+        return '{quantity} of {product} for {depot} in {week}'.format(
+            quantity=self.quantity, product=self.product_id,
+            depot=self.depot_id, week=self.week_id)
+
+
+class ArchivedBasket(models.Model):
+    '''
+    The order basket of a member in a week moved out of the OrderBasket and
+    OrderBasketProduct tables by archive.archive_week. The line items are
+    packed into one binary column of LINE records, a portion id, a count
+    and a price each, with NaN for a line item without a price.
+    '''
+    LINE = struct.Struct('<iid')
+
+    week = models.DateField()
+    user = models.ForeignKey('User', on_delete=models.CASCADE,
+                             related_name='+')
+    edited_weekly_basket = models.BooleanField(default=False)
+    lines = models.BinaryField(blank=True)
+
+    class Meta:
+        ''' '''
+        verbose_name = _('archived basket')
+        verbose_name_plural = _('archived baskets')
+        unique_together = ('week', 'user')
+
+    def __str__(self):
+        year, week = utils.year_week(self.week)
+        return '{user} in {year}-{week}'.format(user=self.user_id, year=year,
+                                                week=week)
+
+    @classmethod
+    def pack(cls, lines):
+        '''
+
+        Args:
+          lines: Iterable of (portion id, count, price).
+
+        Returns:
+          The bytes of the lines column.
+
+        '''
+        return b''.join(cls.LINE.pack(portion, count,
+                                      float('nan') if price is None else price)
+                        for portion, count, price in lines)
+
+    @classmethod
+    def unpack(cls, data):
+        '''
+
+        Args:
+          data: The bytes of the lines column.
+
+        Returns:
+          A list of (portion id, count, price).
+
+        '''
+        return [(portion, count, None if math.isnan(price) else price)
+                for portion, count, price in cls.LINE.iter_unpack(
+                    bytes(data))]
+
+
+class OutboxMail(models.Model):
+    '''
+    An e-mail about a closed week waiting to be sent by the send_mails
+    command. Failed mails stay in the outbox and are tried again.
+    '''
+    SUPERVISOR = 'supervisor'
+    ORDERING = 'ordering'
+    MEMBER = 'member'
+    KINDS = (
+        (SUPERVISOR, _('depot summary')),
+        (ORDERING, _('order summary')),
+        (MEMBER, _('member confirmation')),
+    )
+    week = models.ForeignKey('ClosedWeek', on_delete=models.CASCADE,
+                             related_name='mails')
+    kind = models.CharField(max_length=15, choices=KINDS)
+    user = models.ForeignKey('User', on_delete=models.CASCADE,
+                             related_name='+')
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    attachment_name = models.CharField(max_length=100, blank=True)
+    attachment = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ''' '''
+        verbose_name = _('outbox mail')
+        verbose_name_plural = _('outbox mails')
+        unique_together = ('week', 'kind', 'user')
+        index_together = ('sent', 'attempts')
+
+    def __str__(self):
+        return '{kind} to {recipient}: {subject}'.format(
+            kind=self.kind, recipient=self.recipient, subject=self.subject)
+
+
+@receiver(post_save, sender=OrderBasketProduct)
+def line_item_saved(sender, instance, created, raw=False, **kwargs):
+    '''
+    Add the change of a saved line item to the weekly totals.
+    '''
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded', None)
+    lines = [(instance.basket_id, instance.portion_id, instance.count)]
+    if not created and loaded is not None and None not in loaded:
+        basket_id, portion_id, count = loaded
+        lines.append((basket_id, portion_id, -count))
+    _add_lines_to_weekly_totals(lines)
+    instance._loaded = (instance.basket_id, instance.portion_id,
+                        instance.count)
+
+
+@receiver(post_delete, sender=OrderBasketProduct)
+def line_item_deleted(sender, instance, **kwargs):
+    '''
+    Remove a deleted line item from the weekly totals.
+    '''
+    _add_lines_to_weekly_totals([(instance.basket_id, instance.portion_id,
+                                  -instance.count)])
+
+
+def _add_lines_to_weekly_totals(lines):
+    '''
+
+    Also invalidates the cached order fragments of the members.
+
+    Args:
+      lines: A list of (basket id, portion id, change of the count).
+
+    Returns:
+
+    '''
+    keys = {}
+    for (pk, week, user, depot) in OrderBasket.objects.filter(
+            pk__in={line[0] for line in lines}).values_list(
+                'pk', 'week', 'user', 'user__depot'):
+        keys[pk] = (week, depot)
+        caching.bump('orders', user, week)
+    deltas = Counter()
+    for (basket_id, portion_id, delta) in lines:
+        if basket_id in keys:
+            deltas[keys[basket_id] + (portion_id,)] += delta
+    add_to_weekly_totals(deltas)
+
+
+@receiver(post_save, sender=User)
+def member_saved(sender, instance, created, raw=False, **kwargs):
+    '''
+    Move the orders of a member to the new depot in the weekly totals.
+    '''
+    loaded_depot = getattr(instance, '_loaded_depot', instance.depot_id)
+    if not raw and not created and loaded_depot != instance.depot_id:
+        move_weekly_totals(
+            OrderBasketProduct.objects.filter(basket__user=instance),
+            old_key=lambda week, depot: (week, loaded_depot),
+            new_key=lambda week, depot: (week, depot))
+    instance._loaded_depot = instance.depot_id
+
+
+@receiver(post_delete, sender=ClosedWeek)
+def week_reopened(sender, instance, **kwargs):
+    '''
+    A reopened week is computed from its order baskets again, so archived
+    ones are restored.
+    '''
+    from solawi.archive import restore_week
+    restore_week(instance.week)
+    caching.bump('closed_weeks')
+
+
+@receiver(post_delete, sender=OrderBasket)
+def order_basket_deleted(sender, instance, **kwargs):
+    ''' '''
+    caching.bump('orders', instance.user_id, instance.week)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Portion)
+@receiver(post_delete, sender=Portion)
+def catalogue_changed(sender, **kwargs):
+    '''
+    Invalidate the cached fragments showing portions.
+    '''
+    caching.bump('catalogue')
+
+
+@receiver(post_save, sender=StandingOrder)
+@receiver(post_delete, sender=StandingOrder)
+def standing_orders_changed(sender, **kwargs):
+    '''
+    Invalidate the cached fragments showing baskets which are not created
+    yet.
+    '''
+    caching.bump('standing')
+
+
+@receiver(post_save, sender=WeeklyBasket)
+@receiver(post_delete, sender=WeeklyBasket)
+@receiver(m2m_changed, sender=WeeklyBasket.contents.through)
+def weekly_baskets_changed(sender, **kwargs):
+    '''
+    Invalidate the cached fragments showing weekly baskets.
+    '''
+    caching.bump('weeklybaskets')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=AccountEntry)
+def members_changed(sender, **kwargs):
+    '''
+    Invalidate the cached fragments listing members and their assets.
+    Logins only write the last login and are ignored. There is no
+    post_delete receiver for AccountEntry, as it would make Django delete
+    the expired entries one by one, the deletes bump the version instead.
+    '''
+    if kwargs.get('update_fields') == frozenset(['last_login']):
+        return
+    caching.bump('members')
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    '''
+    Set the journal mode of SQLite databases. In WAL mode the readers do
+    not block the writer and the other way round.
+    '''
+    journal_mode = getattr(settings, 'SQLITE_JOURNAL_MODE', None)
+    if connection.vendor == 'sqlite' and journal_mode:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode = {mode}'.format(
+                mode=journal_mode))
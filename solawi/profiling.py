@@ -0,0 +1,221 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram(object):
+    '''
+    A Prometheus histogram with one series per view, kept in the memory of
+    the process.
+    '''
+
+    def __init__(self, name, help_text, buckets):
+        '''
+
+        Args:
+          name:
+          help_text:
+          buckets: The ascending upper bounds of the buckets.
+
+        '''
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, view, value):
+        '''
+
+        Args:
+          view: The label of the series.
+          value:
+
+        Returns:
+
+        '''
+        with self.lock:
+            counts, total, count = self.series.get(
+                view, ([0] * len(self.buckets), 0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.series[view] = (counts, total + value, count + 1)
+
+    def lines(self):
+        '''
+
+        Returns:
+          Yields the lines of the histogram in the Prometheus text format.
+
+        '''
+        yield '# HELP {name} {help}'.format(name=self.name,
+                                            help=self.help_text)
+        yield '# TYPE {name} histogram'.format(name=self.name)
+        with self.lock:
+            series = sorted((view, list(counts), total, count)
+                            for view, (counts, total, count)
+                            in self.series.items())
+        for view, counts, total, count in series:
+            for bound, bucket_count in list(zip(self.buckets, counts)) + [
+                    ('+Inf', count)]:
+                yield ('{name}_bucket{{view="{view}",le="{le}"}} '
+                       '{count}').format(name=self.name, view=view, le=bound,
+                                         count=bucket_count)
+            yield '{name}_sum{{view="{view}"}} {total}'.format(
+                name=self.name, view=view, total=total)
+            yield '{name}_count{{view="{view}"}} {count}'.format(
+                name=self.name, view=view, count=count)
+
+
+HISTOGRAMS = [
+    Histogram('solawi_request_duration_seconds',
+              'The time from the request to the response.',
+              DURATION_BUCKETS),
+    Histogram('solawi_sql_duration_seconds',
+              'The time spent in SQL queries per request.', DURATION_BUCKETS),
+    Histogram('solawi_sql_queries', 'The SQL queries per request.',
+              QUERY_BUCKETS),
+    Histogram('solawi_template_duration_seconds',
+              'The time spent rendering the template response per request.',
+              DURATION_BUCKETS),
+]
+
+
+def observe(view, duration, sql_duration, queries, template_duration):
+    '''
+    Add a request to the histograms.
+
+    Args:
+      view: The label of the view.
+      duration: Seconds.
+      sql_duration: Seconds.
+      queries: The number of queries.
+      template_duration: Seconds.
+
+    Returns:
+
+    '''
+    for histogram, value in zip(HISTOGRAMS, [duration, sql_duration, queries,
+                                             template_duration]):
+        histogram.observe(view, value)
+
+
+def metrics_text():
+    '''
+
+    Returns:
+      All histograms in the Prometheus text format.
+
+    '''
+    return ''.join(line + '\n' for histogram in HISTOGRAMS
+                   for line in histogram.lines())
+
+
+def view_label(request, view_func):
+    '''
+
+    Args:
+      request:
+      view_func:
+
+    Returns:
+      The name of the view class or function, or admin for all views of
+      the admin site.
+
+    '''
+    match = getattr(request, 'resolver_match', None)
+    if match is not None and 'admin' in match.namespaces:
+        return 'admin'
+    view_class = getattr(view_func, 'view_class', None)
+    if view_class is not None:
+        return view_class.__name__
+    return getattr(view_func, '__name__', 'unknown')
+
+
+class ProfilingMiddleware(object):
+    '''
+    Measures the SQL queries, the template rendering and the latency of
+    every request. The numbers are sent back in a Server-Timing header,
+    added to the histograms served by MetricsView and logged with the
+    slowest queries if the request exceeds PROFILING_SLOW_QUERIES or
+    PROFILING_SLOW_SECONDS. Django 1.10 has no execute wrappers, so the
+    queries are taken from the query log of the connection, which is
+    enabled for the request without DEBUG.
+    '''
+
+    def __init__(self, get_response):
+        '''
+
+        Args:
+          get_response:
+
+        '''
+        self.get_response = get_response
+
+    def __call__(self, request):
+        '''
+
+        Args:
+          request:
+
+        Returns:
+
+        '''
+        request._profiling_view = 'unresolved'
+        force_debug_cursor = connection.force_debug_cursor
+        connection.force_debug_cursor = True
+        first_query = len(connection.queries_log)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            connection.force_debug_cursor = force_debug_cursor
+        duration = time.perf_counter() - start
+        queries = list(connection.queries_log)[first_query:]
+        sql_duration = sum(float(query['time']) for query in queries)
+        template_duration = getattr(request, '_profiling_template', 0)
+        view = request._profiling_view
+        observe(view, duration, sql_duration, len(queries), template_duration)
+
+        response['Server-Timing'] = (
+            'sql;dur={sql:.1f};desc="{count} queries", '
+            'template;dur={template:.1f}, total;dur={total:.1f}'.format(
+                sql=sql_duration * 1000, count=len(queries),
+                template=template_duration * 1000, total=duration * 1000))
+        if len(queries) > settings.PROFILING_SLOW_QUERIES or \
+                duration > settings.PROFILING_SLOW_SECONDS:
+            slowest = sorted(queries, key=lambda query: float(query['time']),
+                             reverse=True)[:5]
+            logger.warning(
+                'Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms, '
+                'template %.0f ms. Slowest queries:\n%s',
+                request.method, request.path, view, duration * 1000,
+                len(queries), sql_duration * 1000, template_duration * 1000,
+                '\n'.join('{time} s: {sql}'.format(**query)
+                          for query in slowest))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        ''' '''
+        request._profiling_view = view_label(request, view_func)
+
+    def process_template_response(self, request, response):
+        '''
+        This middleware comes first, so its hook runs last and the template
+        response gets rendered right after it returns.
+        '''
+        start = time.perf_counter()
+
+        def rendered(response):
+            ''' '''
+            request._profiling_template = time.perf_counter() - start
+        response.add_post_render_callback(rendered)
+        return response
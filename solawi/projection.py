@@ -0,0 +1,157 @@
+from collections import namedtuple
+import datetime
+from django.conf import settings
+from django.db.models import Sum
+from solawi.models import (
+    AccountEntry,
+    StandingOrder,
+    User,
+    WeeklyBasket,
+    account_window_start,
+)
+from solawi import utils
+
+# How many weeks ahead the week of the next extra is searched.
+HORIZON = 52
+
+Projection = namedtuple('Projection', [
+    'balance', 'cap', 'overflow', 'expiring', 'weekly', 'next_extra'])
+Projection.__doc__ = '''
+The projected account of a member.
+
+Attributes:
+  balance: The sum of the valid account entries.
+  cap: The most the account may hold, ACCOUNT_CAP_WEEKLY_BASKETS times the
+    value of the weekly basket, or None without a weekly basket.
+  overflow: The part of the balance above the cap.
+  expiring: The amount expiring at the end of the week.
+  weekly: The change of the balance per week by the standing orders.
+  next_extra: The Monday of the first week the balance pays the extra, or
+    None if it does not within HORIZON weeks.
+'''
+
+
+def weekly_basket_values():
+    '''
+
+    Returns:
+      A dict mapping the weekly basket ids to the sum of the prices of
+      their portions.
+
+    '''
+    return dict(WeeklyBasket.contents.through.objects.order_by().values_list(
+        'weeklybasket').annotate(value=Sum('portion__price')))
+
+
+def standing_order_rates(week, users):
+    '''
+    The change of the accounts per week by the standing orders applying in
+    the week: a de-order credits the portion, a module costs it and an
+    exchange credits the difference, spread over the period.
+
+    Args:
+      week: A day of the week.
+      users: A dict mapping the user ids to their weekly basket ids.
+
+    Returns:
+      A dict mapping the user ids to the change per week.
+
+    '''
+    by_user = {}
+    by_basket = {}
+    for order in StandingOrder.objects.select_related(
+            'portion', 'replacement').active(week):
+        rate = order.portion.price * order.count / order.period
+        if order.kind == StandingOrder.ADD:
+            rate = -rate
+        elif order.kind == StandingOrder.EXCHANGE:
+            rate -= order.replacement.price * order.count / order.period
+        if order.user_id is not None:
+            by_user[order.user_id] = by_user.get(order.user_id, 0) + rate
+        else:
+            by_basket[order.weeklybasket_id] = \
+                by_basket.get(order.weeklybasket_id, 0) + rate
+    if by_basket:
+        for user, basket in users.items():
+            if basket in by_basket:
+                by_user[user] = by_user.get(user, 0) + by_basket[basket]
+    return by_user
+
+
+def project_balances(users=None, date=None, price=None):
+    '''
+    Project the accounts of many members at once. Every input is read with
+    one grouped query into per member rows, which are then run through in a
+    single pass: the entries of a member are bucketed by the week they
+    expire in under the WEEKS_TO_SAVE_ACCOUNTS rule, so the balance of any
+    later week is the balance now, minus the buckets expired by then, plus
+    the standing orders of the weeks in between, capped at
+    ACCOUNT_CAP_WEEKLY_BASKETS weekly baskets.
+
+    Args:
+      users: A queryset of users. (Default value = None, all users)
+      date: (Default value = None, today)
+      price: The price of the extra. (Default value = None, the value of
+        the weekly basket of each member)
+
+    Returns:
+      A dict mapping the user ids to their Projection.
+
+    '''
+    if users is None:
+        users = User.objects.all()
+    monday = utils.get_moday(date)
+    start = utils.date_from_week(*account_window_start(monday))
+    baskets = {}
+    members = {}
+    for (pk, basket, is_member) in users.values_list(
+            'pk', 'weeklybasket', 'is_member').iterator():
+        baskets[pk] = basket
+        members[pk] = is_member
+    values = weekly_basket_values()
+    rates = standing_order_rates(monday, baskets)
+
+    # The entries of a week expire that many weeks after the oldest valid
+    # week.
+    offsets = {}
+    buckets = {}
+    entries = AccountEntry.objects.valid(monday).filter(
+        user__in=users.values('pk')).order_by().values_list(
+            'user', 'year', 'week').annotate(amount=Sum('amount'))
+    for (user, year, week, amount) in entries.iterator():
+        if (year, week) not in offsets:
+            offsets[(year, week)] = (utils.date_from_week(year, week) -
+                                     start).days // 7
+        user_buckets = buckets.setdefault(user, {})
+        offset = offsets[(year, week)]
+        user_buckets[offset] = user_buckets.get(offset, 0) + amount
+
+    cap_baskets = settings.ACCOUNT_CAP_WEEKLY_BASKETS
+    projections = {}
+    for pk, basket in baskets.items():
+        value = values.get(basket) if members[pk] else None
+        user_buckets = buckets.get(pk, {})
+        balance = sum(user_buckets.values())
+        cap = None if value is None else cap_baskets * value
+        overflow = 0 if cap is None else max(0, balance - cap)
+        rate = rates.get(pk, 0)
+        extra = value if price is None else price
+
+        next_extra = None
+        if extra is not None:
+            projected = balance if cap is None else min(balance, cap)
+            for weeks in range(HORIZON + 1):
+                if projected >= extra:
+                    next_extra = monday + datetime.timedelta(7 * weeks)
+                    break
+                if rate <= 0:
+                    # Expiring entries only lower the balance.
+                    break
+                projected += rate - user_buckets.get(weeks, 0)
+                if cap is not None:
+                    projected = min(projected, cap)
+        projections[pk] = Projection(
+            balance=balance, cap=cap, overflow=overflow,
+            expiring=user_buckets.get(0, 0), weekly=rate,
+            next_extra=next_extra)
+    return projections
@@ -0,0 +1,261 @@
+from collections import OrderedDict
+from django.db import connection
+from django.db.models import F, Sum
+from solawi.models import (
+    Depot,
+    OrderBasket,
+    OrderBasketProduct,
+    Portion,
+    Product,
+    User,
+    WeeklyBasket,
+    WeeklyTotal,
+)
+from solawi.snapshots import closed_week
+from solawi.standing import pending_baskets
+from solawi import utils
+
+
+class Pivot(object):
+    '''
+    A dense matrix of values with an index for its rows and columns.
+
+    Attributes:
+      rows: The keys of the rows in order.
+      columns: The keys of the columns in order.
+      row_labels: A dict mapping row keys to their labels.
+      column_labels: A dict mapping column keys to their labels.
+      values: A list of rows, each a list of one value per column.
+    '''
+
+    def __init__(self, cells, row_labels, column_labels):
+        '''
+
+        Args:
+          cells: A dict mapping (row, column) to the value of the cell.
+          row_labels: A dict mapping row keys to their labels.
+          column_labels: A dict mapping column keys to their labels.
+
+        '''
+        self.rows = sorted(row_labels, key=lambda r: str(row_labels[r]))
+        self.columns = sorted(column_labels,
+                              key=lambda c: str(column_labels[c]))
+        self.row_labels = row_labels
+        self.column_labels = column_labels
+        self.row_index = {row: i for i, row in enumerate(self.rows)}
+        self.column_index = {column: i
+                             for i, column in enumerate(self.columns)}
+        self.values = [[0] * len(self.columns) for row in self.rows]
+        for (row, column), value in cells.items():
+            self.values[self.row_index[row]][self.column_index[column]] = value
+
+    def __getitem__(self, key):
+        row, column = key
+        return self.values[self.row_index[row]][self.column_index[column]]
+
+    def row_totals(self):
+        ''' '''
+        return [sum(row) for row in self.values]
+
+    def column_totals(self):
+        ''' '''
+        return [sum(column) for column in zip(*self.values)] or \
+            [0] * len(self.columns)
+
+    def total(self):
+        ''' '''
+        return sum(self.row_totals())
+
+    def __iter__(self):
+        '''
+        Yields (row label, values) for every row.
+        '''
+        for row, values in zip(self.rows, self.values):
+            yield self.row_labels[row], values
+
+
+def _snapshot_cells(closed, by_member):
+    '''
+    The cells of a closed week, read from its snapshots only.
+    '''
+    if not by_member:
+        return {(product, depot): quantity
+                for (product, depot, quantity) in closed.totals.values_list(
+                    'product', 'depot', 'quantity')}
+    return {
+        (product, (depot, member)): quantity
+        for (product, depot, member, quantity) in closed.baskets.order_by(
+            ).values_list('product', 'depot', 'user').annotate(
+                quantity=Sum(F('count') * F('quantity')))}
+
+
+def _live_cells(monday, by_member):
+    '''
+    The cells of a week computed from the weekly totals, or the line items
+    for the columns per member, and the weekly baskets. The baskets which
+    standing orders give members without an order basket are added, as
+    close_week materializes them before it snapshots the week.
+    '''
+    weekly_fields = ['weeklybasket__contents__food', 'depot']
+    if by_member:
+        weekly_fields.append('id')
+        ordered = OrderBasketProduct.objects.filter(
+            basket__week=monday).order_by().values_list(
+                'portion__food', 'basket__user__depot',
+                'basket__user').annotate(
+                    quantity=Sum(F('count') * F('portion__quantity')))
+    else:
+        # The weekly totals hold one row per depot and portion.
+        ordered = WeeklyTotal.objects.filter(
+            week=monday).order_by().values_list(
+                'portion__food', 'depot').annotate(
+                    quantity=Sum(F('count') * F('portion__quantity')))
+    edited = OrderBasket.objects.filter(
+        week=monday, edited_weekly_basket=True).values('user')
+    pending = pending_baskets(monday)
+    pending_edited = [user for user, (pending_edit, lines) in pending.items()
+                      if pending_edit]
+    weekly = User.objects.filter(
+        is_member=True, weeklybasket__contents__isnull=False).exclude(
+            pk__in=edited).exclude(pk__in=pending_edited).order_by(
+                ).values_list(*weekly_fields).annotate(
+                    quantity=Sum('weeklybasket__contents__quantity'))
+
+    cells = {}
+    for row in list(ordered) + list(weekly):
+        product, column, quantity = row[0], tuple(row[1:-1]), row[-1]
+        if not by_member:
+            column = column[0]
+        cells[(product, column)] = cells.get((product, column), 0) + quantity
+    if pending:
+        portions = {pk: (product, quantity)
+                    for (pk, product, quantity) in Portion.objects.values_list(
+                        'pk', 'food', 'quantity')}
+        for (user, depot) in User.objects.filter(
+                pk__in=list(pending)).values_list('pk', 'depot'):
+            column = (depot, user) if by_member else depot
+            for portion, count in pending[user][1].items():
+                product, quantity = portions[portion]
+                cells[(product, column)] = \
+                    cells.get((product, column), 0) + count * quantity
+    return cells
+
+
+def week_pivot(week=None, by_member=False):
+    '''
+    The products ordered in a week per depot or per member. The values are
+    the ordered quantities in the unit of the product. Members who did not
+    edit their weekly basket in this week, or have no order basket at all,
+    get their full weekly basket counted. Closed weeks are read from their
+    snapshots only.
+
+    Args:
+      week: A day of the week. (Default value = None, the current week)
+      by_member: Use (depot, member) pairs as columns instead of depots.
+        (Default value = False)
+
+    Returns:
+      A Pivot with the product ids as rows and the depot ids or the
+      (depot id, member id) pairs as columns.
+
+    '''
+    monday = utils.get_moday(week)
+    closed = closed_week(monday)
+    if closed is not None:
+        cells = _snapshot_cells(closed, by_member)
+    else:
+        cells = _live_cells(monday, by_member)
+
+    row_labels = {
+        pk: '{name} ({unit})'.format(name=name, unit=unit)
+        for (pk, name, unit) in Product.objects.filter(
+            pk__in={product for (product, column) in cells}).values_list(
+                'pk', 'name', 'unit')}
+    depots = {pk: name for (pk, name) in Depot.objects.values_list(
+        'pk', 'name')}
+    if by_member:
+        members = {
+            pk: utils.member_name(first_name, last_name, username)
+            for (pk, first_name, last_name, username)
+            in User.objects.values_list(
+                'pk', 'first_name', 'last_name', 'username').iterator()}
+        column_labels = {(depot, member): '{depot}: {member}'.format(
+            depot=depots.get(depot, '-'), member=members[member])
+            for (product, (depot, member)) in cells}
+    else:
+        column_labels = {depot: depots.get(depot, '-')
+                         for (product, depot) in cells}
+    return Pivot(cells, row_labels, column_labels)
+
+
+def basket_state_sql(week=None):
+    '''
+    Correlated subqueries for the basket of every user in a week. Django
+    1.10 has no Subquery expression, and joining the order baskets of all
+    weeks to aggregate one of them would read the whole history.
+
+    Args:
+      week: A day of the week. (Default value = None)
+
+    Returns:
+      An OrderedDict mapping has_basket, edited, item_count and total_price
+      to a tuple of the SQL and its params. The counts include the weekly
+      basket if the member gets it.
+
+    '''
+    monday = utils.get_moday(week)
+    qn = connection.ops.quote_name
+    tables = {
+        'user': qn(User._meta.db_table),
+        'basket': qn(OrderBasket._meta.db_table),
+        'line': qn(OrderBasketProduct._meta.db_table),
+        'contents': qn(WeeklyBasket.contents.through._meta.db_table),
+        'portion': qn(Portion._meta.db_table),
+    }
+    basket = ('FROM {basket} b WHERE b.user_id = {user}.id '
+              'AND b.week = %s').format(**tables)
+    lines = ('FROM {line} l INNER JOIN {basket} b ON l.basket_id = b.id '
+             'WHERE b.user_id = {user}.id AND b.week = %s').format(**tables)
+    contents = ('FROM {contents} c INNER JOIN {portion} p '
+                'ON c.portion_id = p.id '
+                'WHERE c.weeklybasket_id = {user}.weeklybasket_id').format(
+                    **tables)
+    edited = '(SELECT COUNT(*) {basket} AND b.edited_weekly_basket = ' \
+        '%s)'.format(basket=basket)
+    gets_weekly = 'CASE WHEN {user}.is_member = %s AND {edited} = 0 ' \
+        'THEN 1 ELSE 0 END'.format(edited=edited, **tables)
+    return OrderedDict([
+        ('has_basket', ('(SELECT COUNT(*) {basket})'.format(basket=basket),
+                        [monday])),
+        ('edited', (edited, [monday, True])),
+        ('item_count', (
+            '(SELECT COALESCE(SUM(l.count), 0) {lines}) + {gets_weekly} * '
+            '(SELECT COUNT(*) {contents})'.format(
+                lines=lines, gets_weekly=gets_weekly, contents=contents),
+            [monday, True, monday, True])),
+        ('total_price', (
+            '(SELECT COALESCE(SUM(l.count * l.price), 0) {lines}) + '
+            '{gets_weekly} * (SELECT COALESCE(SUM(p.price), 0) '
+            '{contents})'.format(lines=lines, gets_weekly=gets_weekly,
+                                 contents=contents),
+            [monday, True, monday, True])),
+    ])
+
+
+def with_basket_state(members, week=None):
+    '''
+
+    Args:
+      members: A queryset of users.
+      week: A day of the week. (Default value = None)
+
+    Returns:
+      The queryset with the columns of basket_state_sql selected.
+
+    '''
+    state = basket_state_sql(week)
+    return members.extra(
+        select=OrderedDict((name, sql) for name, (sql, params)
+                           in state.items()),
+        select_params=[param for sql, params in state.values()
+                       for param in params])
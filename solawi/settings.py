@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/1.10/ref/settings/
 """
 
+import datetime
 import os
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'solawi.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,6 +80,31 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Seconds a connection is kept open for the following requests.
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {
+            # Seconds a writer waits for the lock of a concurrent one.
+            'timeout': 20,
+        },
+    }
+}
+
+# The journal mode set on every new SQLite connection, None keeps the one
+# of the database file.
+SQLITE_JOURNAL_MODE = 'WAL'
+
+
+# Cache
+# https://docs.djangoproject.com/en/1.10/topics/cache/
+# The cached fragments are invalidated by version keys in the cache itself,
+# so all processes serving the site have to share the cache. A file based
+# cache does that without an extra service, a local memory cache only for
+# a single process.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
     }
 }
 
@@ -130,3 +157,34 @@ STATIC_URL = '/static/'
 
 # SoLaWi Settings:
 WEEKS_TO_SAVE_ACCOUNTS = 10
+# The most an account may hold, counted in weekly baskets.
+ACCOUNT_CAP_WEEKLY_BASKETS = 8
+# When the orders of a week close, counted from Monday 0:00 of the week.
+ORDER_CUTOFF = datetime.timedelta(days=1, hours=12)
+# How often a write to an order basket is tried when it collides with a
+# concurrent one.
+ORDER_WRITE_ATTEMPTS = 5
+# Seconds a rendered fragment of the member pages stays cached.
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+# Members per page of the depot view.
+DEPOT_PAGE_SIZE = 50
+# The archive_weeks command packs the order baskets of closed weeks older
+# than this many weeks into archived baskets.
+ARCHIVE_AFTER_WEEKS = 52
+# Requests with more queries or taking more seconds are logged with their
+# slowest queries.
+PROFILING_SLOW_QUERIES = 50
+PROFILING_SLOW_SECONDS = 1.0
+# The addresses allowed to scrape /metrics.
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+
+# E-mail
+# The send_mails command sends the mails about closed weeks. Use
+# 'django.core.mail.backends.filebased.EmailBackend' with EMAIL_FILE_PATH to
+# look at them without a mail server.
+DEFAULT_FROM_EMAIL = 'solawi@localhost'
+# Also send every member a confirmation of the basket of a closed week.
+MAIL_MEMBER_CONFIRMATIONS = False
+# How often sending a mail is tried before it is left in the outbox.
+MAIL_MAX_ATTEMPTS = 5
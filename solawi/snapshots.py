@@ -0,0 +1,146 @@
+from collections import Counter
+import datetime
+from django.db import transaction
+from solawi.models import (
+    BasketSnapshot,
+    ClosedWeek,
+    OrderBasket,
+    OrderBasketProduct,
+    Portion,
+    TotalSnapshot,
+    User,
+)
+from solawi.standing import materialize_week
+from solawi import caching
+from solawi import utils
+
+
+def final_baskets(monday):
+    '''
+    The baskets of all members in a week, computed with three queries: the
+    line items of the order baskets plus the weekly baskets of the members
+    who did not edit theirs.
+
+    Args:
+      monday:
+
+    Returns:
+      A tuple of a Counter mapping (user id, portion id) to the count, a dict
+      mapping the user ids to their depot ids and a dict mapping (user id,
+      portion id) to the price of the line item.
+
+    '''
+    counts = Counter()
+    depots = {}
+    prices = {}
+    for (user, depot, portion, count, price) in \
+            OrderBasketProduct.objects.filter(basket__week=monday).values_list(
+                'basket__user', 'basket__user__depot', 'portion', 'count',
+                'price').iterator():
+        counts[(user, portion)] += count
+        depots[user] = depot
+        prices[(user, portion)] = price
+
+    edited = OrderBasket.objects.filter(
+        week=monday, edited_weekly_basket=True).values('user')
+    for (user, depot, portion) in User.objects.filter(
+            is_member=True, weeklybasket__contents__isnull=False).exclude(
+                pk__in=edited).values_list(
+                    'pk', 'depot', 'weeklybasket__contents').iterator():
+        counts[(user, portion)] += 1
+        depots[user] = depot
+    return counts, depots, prices
+
+
+def close_week(week=None):
+    '''
+    Freeze the final baskets of all members and the totals per depot and
+    product of a week. Weekly baskets are taken as they are now, so a week
+    should be closed soon after its order cutoff. The standing orders of
+    members without a basket are materialized first.
+
+    Args:
+      week: A day of the week. (Default value = None, the current week)
+
+    Returns:
+      The ClosedWeek, or None if the week was already closed.
+
+    '''
+    monday = utils.get_moday(week)
+    with transaction.atomic():
+        closed_week, created = ClosedWeek.objects.get_or_create(week=monday)
+        if not created:
+            return None
+        materialize_week(monday)
+        counts, depots, prices = final_baskets(monday)
+        portions = {pk: (product, quantity, price)
+                    for (pk, product, quantity, price)
+                    in Portion.objects.values_list(
+                        'pk', 'food', 'quantity', 'price')}
+
+        baskets = []
+        totals = {}
+        for (user, portion), count in counts.items():
+            product, quantity, price = portions[portion]
+            if prices.get((user, portion)) is not None:
+                price = prices[(user, portion)]
+            baskets.append(BasketSnapshot(
+                week=closed_week, user_id=user, depot_id=depots[user],
+                portion_id=portion, product_id=product, quantity=quantity,
+                count=count, price=price))
+            total = totals.setdefault((depots[user], product), [0, 0])
+            total[0] += count * quantity
+            total[1] += count * price
+        BasketSnapshot.objects.bulk_create(baskets)
+        TotalSnapshot.objects.bulk_create([
+            TotalSnapshot(week=closed_week, depot_id=depot,
+                          product_id=product, quantity=quantity, price=price)
+            for (depot, product), (quantity, price) in totals.items()])
+        caching.bump('closed_weeks')
+    return closed_week
+
+
+def due_weeks(now=None):
+    '''
+    The weeks whose orders are closed but which have no snapshot yet,
+    starting after the last closed week or with the first order basket.
+
+    Args:
+      now: (Default value = None, the current time)
+
+    Returns:
+      A list of Mondays.
+
+    '''
+    last = utils.get_moday(now.date() if now is not None else None)
+    if not utils.orders_closed(last, now):
+        last -= datetime.timedelta(7)
+    latest = ClosedWeek.objects.order_by('-week').values_list(
+        'week', flat=True).first()
+    if latest is not None:
+        first = latest + datetime.timedelta(7)
+    else:
+        first = OrderBasket.objects.order_by('week').values_list(
+            'week', flat=True).first() or last
+    weeks = []
+    while first <= last:
+        weeks.append(first)
+        first += datetime.timedelta(7)
+    return weeks
+
+
+def closed_week(week=None):
+    '''
+
+    Args:
+      week: A day of the week. (Default value = None)
+
+    Returns:
+      The ClosedWeek of the week or None. Only queries the database once
+      the order cutoff of the week has passed.
+
+    '''
+    monday = utils.get_moday(week)
+    if not utils.orders_closed(monday):
+        return None
+    return ClosedWeek.objects.filter(week=monday).first()
@@ -0,0 +1,90 @@
+from collections import Counter
+from django.db import transaction
+from solawi.baskets import apply_standing_orders
+from solawi.models import (
+    OrderBasket,
+    OrderBasketProduct,
+    Portion,
+    add_to_weekly_totals,
+    standing_order_changes,
+    weekly_basket_counters,
+)
+from solawi import caching
+from solawi import utils
+
+
+def pending_baskets(week=None):
+    '''
+    The order baskets the standing orders of a week give the members who
+    have no basket in it yet, without writing them. Reports of open weeks
+    add them to the order baskets, as materialize_week only writes them
+    when the week is materialized or closed.
+
+    Args:
+      week: A day of the week. (Default value = None, the current week)
+
+    Returns:
+      A dict mapping the user ids to a tuple of the edited_weekly_basket
+      flag and the Counter of the line items. Members whose standing orders
+      change nothing are left out.
+
+    '''
+    monday = utils.get_moday(week)
+    changes, users = standing_order_changes(monday, None)
+    if not changes:
+        return {}
+    existing = set(OrderBasket.objects.filter(week=monday).values_list(
+        'user', flat=True))
+    weekly = weekly_basket_counters(set(users.values()))
+    baskets = {}
+    for user, user_changes in changes.items():
+        if user in existing:
+            continue
+        edited, lines = apply_standing_orders(
+            weekly.get(users[user], Counter()), user_changes)
+        if edited or lines:
+            baskets[user] = (edited, lines)
+    return baskets
+
+
+def materialize_week(week=None):
+    '''
+    Create the order baskets of a week for all members with standing orders
+    in it who have no basket yet. The standing orders, weekly baskets and
+    existing baskets are read with a fixed number of queries and the new
+    baskets and line items are written with two bulk inserts, however many
+    members there are. Members who already have a basket keep it as it is.
+
+    Args:
+      week: A day of the week. (Default value = None, the current week)
+
+    Returns:
+      The number of created baskets.
+
+    '''
+    monday = utils.get_moday(week)
+    with transaction.atomic():
+        baskets = pending_baskets(monday)
+        if not baskets:
+            return 0
+
+        OrderBasket.objects.bulk_create([
+            OrderBasket(user_id=user, week=monday, edited_weekly_basket=edited)
+            for user, (edited, lines) in baskets.items()])
+        prices = dict(Portion.objects.values_list('pk', 'price'))
+        items = []
+        deltas = Counter()
+        for (user, pk, depot) in OrderBasket.objects.filter(
+                week=monday).values_list('user', 'pk', 'user__depot'):
+            if user not in baskets:
+                continue
+            for portion, count in baskets[user][1].items():
+                items.append(OrderBasketProduct(
+                    basket_id=pk, portion_id=portion, count=count,
+                    price=prices[portion]))
+                deltas[(monday, depot, portion)] += count
+            caching.bump('orders', user, monday)
+        OrderBasketProduct.objects.bulk_create(items)
+        add_to_weekly_totals(deltas)
+        caching.bump('totals')
+    return len(baskets)
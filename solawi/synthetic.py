@@ -0,0 +1,114 @@
+import datetime
+import random
+from django.contrib.auth.hashers import make_password
+from solawi.models import (
+    Depot,
+    OrderBasket,
+    OrderBasketProduct,
+    Portion,
+    Product,
+    User,
+    WeeklyBasket,
+    rebuild_weekly_totals,
+)
+from solawi import utils
+
+
+def seed_farm(depots=5, members=100, products=20, weeks=8, prefix='synth',
+              seed=None):
+    '''
+    Create a synthetic SoLaWi with bulk_create only: depots, weekly baskets,
+    products with three portions each, members and the order history of the
+    last weeks. All names start with the prefix, so several farms can live
+    in the same database. The weekly totals of the seeded weeks are rebuilt
+    from the line items afterwards.
+
+    Args:
+      depots: (Default value = 5)
+      members: (Default value = 100)
+      products: (Default value = 20)
+      weeks: Number of past weeks with order baskets. (Default value = 8)
+      prefix: (Default value = 'synth')
+      seed: Seed of the random generator. (Default value = None)
+
+    Returns:
+      A dict with the number of created rows per model.
+
+    '''
+    rand = random.Random(seed)
+    Depot.objects.bulk_create([
+        Depot(name='{p}-depot-{i}'.format(p=prefix, i=i),
+              location='{p}-location-{i}'.format(p=prefix, i=i))
+        for i in range(depots)])
+    depot_ids = list(Depot.objects.filter(
+        name__startswith=prefix + '-').values_list('pk', flat=True))
+
+    Product.objects.bulk_create([
+        Product(name='{p}-product-{i}'.format(p=prefix, i=i), unit='kg',
+                price=round(rand.uniform(0.5, 10), 2))
+        for i in range(products)])
+    product_prices = dict(Product.objects.filter(
+        name__startswith=prefix + '-').values_list('pk', 'price'))
+    Portion.objects.bulk_create([
+        Portion(food_id=product_id, quantity=quantity,
+                price=quantity * price)
+        for product_id, price in product_prices.items()
+        for quantity in (1, 2, 5)])
+    portion_prices = dict(Portion.objects.filter(
+        food__in=product_prices).values_list('pk', 'price'))
+    portion_ids = list(portion_prices)
+
+    WeeklyBasket.objects.bulk_create([
+        WeeklyBasket(name='{p}-{size}'.format(p=prefix, size=size))
+        for size in ('small', 'big')])
+    basket_ids = list(WeeklyBasket.objects.filter(
+        name__startswith=prefix + '-').values_list('pk', flat=True))
+    Through = WeeklyBasket.contents.through
+    Through.objects.bulk_create([
+        Through(weeklybasket_id=basket_id, portion_id=portion_id)
+        for basket_id in basket_ids
+        for portion_id in rand.sample(portion_ids, min(8, len(portion_ids)))])
+
+    password = make_password(prefix)
+    User.objects.bulk_create([
+        User(username='{p}-member-{i}'.format(p=prefix, i=i),
+             first_name='Member', last_name=str(i), password=password,
+             depot_id=rand.choice(depot_ids),
+             weeklybasket_id=rand.choice(basket_ids),
+             is_supervisor=(i % 50 == 0))
+        for i in range(members)])
+    synthetic_members = User.objects.filter(
+        username__startswith=prefix + '-member-')
+    user_ids = list(synthetic_members.values_list('pk', flat=True))
+
+    this_monday = utils.get_moday()
+    mondays = [this_monday - datetime.timedelta(7 * i)
+               for i in range(weeks)]
+    OrderBasket.objects.bulk_create([
+        OrderBasket(week=monday, user_id=user_id,
+                    edited_weekly_basket=rand.random() < 0.3)
+        for monday in mondays for user_id in user_ids
+        if rand.random() < 0.7])
+    order_ids = OrderBasket.objects.filter(
+        user__in=synthetic_members, week__in=mondays).values_list(
+            'pk', flat=True)
+    OrderBasketProduct.objects.bulk_create([
+        OrderBasketProduct(basket_id=order_id, portion_id=portion_id,
+                           count=rand.randint(1, 3),
+                           price=portion_prices[portion_id])
+        for order_id in order_ids.iterator()
+        for portion_id in rand.sample(portion_ids,
+                                      rand.randint(0, min(5,
+                                                          len(portion_ids))))
+    ])
+    rebuild_weekly_totals(mondays)
+
+    return {
+        'depots': len(depot_ids),
+        'products': len(product_prices),
+        'portions': len(portion_ids),
+        'members': len(user_ids),
+        'order baskets': order_ids.count(),
+        'line items': OrderBasketProduct.objects.filter(
+            basket__user__in=synthetic_members).count(),
+    }
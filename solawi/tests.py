@@ -0,0 +1,151 @@
+import datetime
+from collections import Counter
+from django.test import TestCase, override_settings
+from solawi.exports import packing_list_rows
+from solawi.models import (
+    Depot,
+    OrderBasket,
+    OrderBasketProduct,
+    Portion,
+    Product,
+    StandingOrder,
+    User,
+    WeeklyBasket,
+)
+from solawi.reports import week_pivot
+from solawi.snapshots import close_week
+from solawi import utils
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, DEPOT_PAGE_SIZE=3)
+class DepotViewTest(TestCase):
+    ''' '''
+
+    @classmethod
+    def setUpTestData(cls):
+        ''' '''
+        cls.depot = Depot.objects.create(name='Depot', location='Town')
+        for i in range(10):
+            User.objects.create_user(
+                'member{i}'.format(i=i), depot=cls.depot, is_member=False,
+                assets=None if i % 3 == 0 else i)
+        cls.user = User.objects.get(username='member1')
+
+    def walk(self, sort):
+        '''
+        Follow the next page links of the depot view.
+
+        Args:
+          sort: The sort parameter.
+
+        Returns:
+          The usernames of all pages in their order.
+
+        '''
+        self.client.force_login(self.user)
+        url = '/depot/{depot}/?sort={sort}'.format(depot=self.depot.pk,
+                                                   sort=sort)
+        usernames = []
+        while url is not None:
+            view = self.client.get(url).context['view']
+            usernames.extend(member.username for member in view.members)
+            url = view.next_page
+            if url is not None:
+                url = '/depot/{depot}/{query}'.format(depot=self.depot.pk,
+                                                      query=url)
+        return usernames
+
+    def test_pages_show_every_member(self):
+        ''' '''
+        members = set(self.depot.members.values_list('username', flat=True))
+        for sort in ['name', '-name', 'assets', '-assets', 'items', 'total']:
+            with self.subTest(sort=sort):
+                usernames = self.walk(sort)
+                self.assertEqual(len(usernames), len(members))
+                self.assertEqual(set(usernames), members)
+
+    def test_missing_assets_sort_as_zero(self):
+        ''' '''
+        assets = dict(User.objects.values_list('username', 'assets'))
+        usernames = self.walk('assets')
+        self.assertEqual([assets[username] or 0 for username in usernames],
+                         sorted(assets[username] or 0
+                                for username in usernames))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StandingOrderReportTest(TestCase):
+    '''
+    The reports of an open week count the standing orders of members
+    without an order basket like the snapshots of the closed week.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        ''' '''
+        cls.monday = utils.get_moday() - datetime.timedelta(14)
+        cls.depot = Depot.objects.create(name='Depot', location='Town')
+        carrots = Product.objects.create(name='Carrots', unit='kg', price=2)
+        milk = Product.objects.create(name='Milk', unit='L', price=1)
+        small = Portion.objects.create(food=carrots, quantity=2, price=4)
+        large = Portion.objects.create(food=carrots, quantity=3, price=6)
+        bottle = Portion.objects.create(food=milk, quantity=1, price=1)
+        full = WeeklyBasket.objects.create(name='Full')
+        full.contents.add(small, bottle)
+        plain = WeeklyBasket.objects.create(name='Plain')
+        plain.contents.add(small)
+        members = {}
+        for name, basket in [('weekly', full), ('module', full),
+                             ('deorder', full), ('exchange', plain),
+                             ('ordered', full)]:
+            members[name] = User.objects.create_user(
+                name, depot=cls.depot, weeklybasket=basket)
+        StandingOrder.objects.create(
+            user=members['module'], kind=StandingOrder.ADD, portion=large,
+            count=2, start=cls.monday)
+        StandingOrder.objects.create(
+            user=members['deorder'], kind=StandingOrder.REMOVE,
+            portion=bottle, start=cls.monday)
+        StandingOrder.objects.create(
+            weeklybasket=plain, kind=StandingOrder.EXCHANGE, portion=small,
+            replacement=large, start=cls.monday)
+        StandingOrder.objects.create(
+            user=members['ordered'], kind=StandingOrder.ADD, portion=bottle,
+            start=cls.monday)
+        basket = OrderBasket.objects.create(week=cls.monday,
+                                            user=members['ordered'])
+        OrderBasketProduct.objects.create(basket=basket, portion=large,
+                                          count=1, price=6)
+
+    def packing_list(self):
+        '''
+
+        Returns:
+          A Counter of the packed (member, product, quantity, unit).
+
+        '''
+        rows = packing_list_rows(self.depot, self.monday)
+        next(rows)
+        counts = Counter()
+        for (depot, member, product, quantity, unit, count) in rows:
+            counts[(member, product, quantity, unit)] += count
+        return +counts
+
+    def test_live_and_closed_figures_match(self):
+        ''' '''
+        live_pivot = week_pivot(self.monday)
+        live_totals = dict(live_pivot)
+        live_members = dict(week_pivot(self.monday, by_member=True))
+        live_packing_list = self.packing_list()
+
+        close_week(self.monday)
+        closed_pivot = week_pivot(self.monday)
+        self.assertEqual(live_totals, dict(closed_pivot))
+        self.assertEqual(live_pivot.total(), closed_pivot.total())
+        self.assertEqual(live_members,
+                         dict(week_pivot(self.monday, by_member=True)))
+        self.assertEqual(live_packing_list, self.packing_list())
@@ -21,7 +21,21 @@ from . import views
 urlpatterns = [
     url('^', include('django.contrib.auth.urls')),
     url(r'^admin/', admin.site.urls),
+    url(r'^api/catalogue/$', views.CatalogueJSONView.as_view()),
+    url(r'^api/depot/(?P<depot_id>[0-9]+)/$', views.DepotJSONView.as_view()),
+    url(r'^api/totals/$', views.TotalsJSONView.as_view()),
+    url(r'^api/totals/(?P<year>[0-9]{4})/(?P<week>[0-9]{1,2})/$', views.TotalsJSONView.as_view()),
+    url(r'^api/urlaub/$', views.VacationJSONView.as_view()),
+    url(r'^api/woche/$', views.BasketJSONView.as_view()),
+    url(r'^api/woche/(?P<year>[0-9]{4})/(?P<week>[0-9]{1,2})/$', views.BasketJSONView.as_view()),
     url(r'^depot/(?P<depot_id>[0-9]+)/$', views.DepotView.as_view()),
+    url(r'^depot/(?P<depot_id>[0-9]+)/export/(?P<year>[0-9]{4})/(?P<week>[0-9]{1,2})/$', views.PackingListExportView.as_view()),
+    url(r'^export/(?P<year>[0-9]{4})/(?P<week>[0-9]{1,2})/$', views.TotalsExportView.as_view()),
+    url(r'^export/(?P<year>[0-9]{4})/(?P<week>[0-9]{1,2})/history/(?P<weeks>[0-9]{1,3})/$', views.HistoryExportView.as_view()),
+    url(r'^metrics$', views.MetricsView.as_view()),
+    url(r'^totals/$', views.TotalsView.as_view()),
+    url(r'^totals/(?P<year>[0-9]{4})/(?P<week>[0-9]{1,2})/$', views.TotalsView.as_view()),
+    url(r'^urlaub/$', views.VacationView.as_view()),
     url(r'^woche/$', views.WeekView.as_view()),
     url(r'^woche/(?P<year>[0-9]{4})/$', views.WeekView.as_view()),
     url(r'^woche/(?P<year>[0-9]{4})/(?P<week>[0-9]{1,2})/$', views.WeekView.as_view()),
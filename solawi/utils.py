@@ -1,5 +1,9 @@
 import copy
 import datetime
+import functools
+from django.conf import settings
+from django.utils import timezone
+
 
 def view_property(method):
     '''
@@ -28,6 +32,22 @@ def view_property(method):
     return method_wrapper
 
 
+def reset_view_properties(view, *names):
+    '''
+    Forget the cached values of view properties, so they get recomputed on
+    the next access.
+
+    Args:
+      view:
+      *names: The names of the view properties.
+
+    Returns:
+
+    '''
+    for name in names:
+        view.__dict__.pop('_' + name, None)
+
+
 def get_moday(date=None):
     '''
 
@@ -42,6 +62,90 @@ def get_moday(date=None):
     return date - datetime.timedelta(date.weekday())
 
 
+@functools.lru_cache(maxsize=None)
+def calendar_year(year):
+    '''
+    The week calendar of one year in the %W convention of strftime, where
+    week 1 starts with the first Monday of the year. Memoized, so every
+    year is computed once per process.
+
+    Args:
+      year:
+
+    Returns:
+      A tuple with the Monday of every week 0 to 53 of the year.
+
+    '''
+    jan_first = datetime.date(year, 1, 1)
+    week_0_length = (7 - jan_first.weekday()) % 7
+    # Week 0 starts on the Monday before the first of January like
+    # strptime('%Y-%W-%w') does, unless the year starts on a Monday.
+    mondays = [jan_first - datetime.timedelta(jan_first.weekday())]
+    for week in range(1, 54):
+        mondays.append(jan_first + datetime.timedelta(
+            week_0_length + 7 * (week - 1)))
+    for week, monday in enumerate(mondays[1:], 1):
+        if monday.year == year:
+            _week_of_monday[monday] = (year, week)
+    return tuple(mondays)
+
+
+def order_cutoff(date=None):
+    '''
+
+    Args:
+      date: A day of the week. (Default value = None)
+
+    Returns:
+      The aware datetime when the orders of the week close.
+
+    '''
+    monday = datetime.datetime.combine(get_moday(date), datetime.time())
+    return timezone.make_aware(monday) + settings.ORDER_CUTOFF
+
+
+def orders_closed(date=None, now=None):
+    '''
+    If the orders of the week are closed. Needs no query.
+
+    Args:
+      date: A day of the week. (Default value = None)
+      now: (Default value = None, the current time)
+
+    Returns:
+
+    '''
+    if now is None:
+        now = timezone.now()
+    return order_cutoff(date) <= now
+
+
+_week_of_monday = {}
+
+
+def year_week(date=None):
+    '''
+
+    Args:
+      date: (Default value = None)
+
+    Returns:
+      The tuple (year, week) the date lies in.
+
+    '''
+    if date is None:
+        date = datetime.date.today()
+    monday = date - datetime.timedelta(date.weekday())
+    if monday.year == date.year:
+        try:
+            return _week_of_monday[monday]
+        except KeyError:
+            calendar_year(monday.year)
+            return _week_of_monday[monday]
+    # The days of January before the first Monday are week 0.
+    return date.year, 0
+
+
 def this_year():
     ''' '''
     return datetime.date.today().year
@@ -49,7 +153,7 @@ def this_year():
 
 def this_week():
     ''' '''
-    return int(datetime.date.today().strftime('%W'))
+    return year_week()[1]
 
 
 def date_from_week(year=None, week=None):
@@ -60,11 +164,101 @@ def date_from_week(year=None, week=None):
       week: (Default value = None)
 
     Returns:
+      The Monday of the week.
 
     '''
     if year is None:
         year = this_year()
     if week is None:
         week = this_week()
+    week = int(week)
+    if not 0 <= week <= 53:
+        raise ValueError('{w} is not a week number.'.format(w=week))
+    return calendar_year(int(year))[week]
+
+
+def date_from_week_strptime(year=None, week=None):
+    '''
+    The former strptime based implementation of date_from_week. Only kept
+    to compare against in the benchmark_weeks command.
+
+    Args:
+      year: (Default value = None)
+      week: (Default value = None)
+
+    Returns:
+
+    '''
+    if year is None:
+        year = this_year()
+    if week is None:
+        week = int(datetime.date.today().strftime('%W'))
     dstr = '{year}-{week}-1'.format(year=year, week=week)
     return datetime.datetime.strptime(dstr, '%Y-%W-%w')
+
+
+def iter_weeks(first_year, last_year):
+    '''
+
+    Args:
+      first_year:
+      last_year:
+
+    Returns:
+      Yields (year, week, monday, sunday, iso) for every week of the years,
+      where iso tells if the week number agrees with the ISO week.
+
+    '''
+    for year in range(first_year, last_year + 1):
+        for week, monday in enumerate(calendar_year(year)):
+            if year_week(monday) != (year, week):
+                # Week 0 of a year starting on a Monday is week 1.
+                continue
+            iso = monday.isocalendar()[:2] == (year, week)
+            yield year, week, monday, monday + datetime.timedelta(6), iso
+
+
+def keyset_condition(keys, values, descending=False):
+    '''
+    The SQL condition selecting the rows after a row in the order of the
+    keys, for paginating without an offset.
+
+    Args:
+      keys: A list of tuples of the SQL of a key and its params.
+      values: The values of the keys in the last row of the previous page.
+      descending: If the rows are sorted descending by all keys.
+        (Default value = False)
+
+    Returns:
+      A tuple of the SQL and its params.
+
+    '''
+    operator = '<' if descending else '>'
+    clauses = []
+    params = []
+    for i, (sql, key_params) in enumerate(keys):
+        parts = []
+        for (equal_sql, equal_params), value in zip(keys[:i], values):
+            parts.append('{sql} = %s'.format(sql=equal_sql))
+            params.extend(equal_params + [value])
+        parts.append('{sql} {operator} %s'.format(sql=sql, operator=operator))
+        params.extend(key_params + [values[i]])
+        clauses.append('(' + ' AND '.join(parts) + ')')
+    return '(' + ' OR '.join(clauses) + ')', params
+
+
+def member_name(first_name, last_name, username):
+    '''
+    The name of a member as the pages, exports and mails show it.
+
+    Args:
+      first_name:
+      last_name:
+      username: Shown if the member has no name.
+
+    Returns:
+
+    '''
+    if first_name == '' and last_name == '':
+        return username
+    return first_name + ' ' + last_name
@@ -0,0 +1,114 @@
+from collections import Counter
+import datetime
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils.translation import ugettext_lazy as _
+from solawi.models import (
+    AccountEntry,
+    OrderBasket,
+    OrderBasketProduct,
+    User,
+    delete_line_items,
+)
+from solawi import caching
+from solawi import utils
+
+
+def vacation_weeks(first, last):
+    '''
+
+    Args:
+      first: A day of the first week.
+      last: A day of the last week.
+
+    Returns:
+      The list of the Mondays from the first to the last week.
+
+    '''
+    monday = utils.get_moday(first)
+    last = utils.get_moday(last)
+    weeks = []
+    while monday <= last:
+        weeks.append(monday)
+        monday += datetime.timedelta(7)
+    return weeks
+
+
+def cancel_weeks(user, first, last):
+    '''
+    Cancel the baskets of a member from the first to the last week, e.g. for
+    a vacation. Every basket in the range is marked as an edited weekly
+    basket without line items, and the value of the weekly basket portions
+    the member would still have got is credited to its account. All weeks
+    are written in one transaction with a constant number of queries, so
+    cancelling 20 weeks costs about as much as cancelling 2. Cancelling a
+    week again credits nothing.
+
+    Args:
+      user: The member.
+      first: A day of the first week.
+      last: A day of the last week.
+
+    Returns:
+      A dict mapping the Mondays of the cancelled weeks to the credited
+      amounts.
+
+    '''
+    weeks = vacation_weeks(first, last)
+    if not weeks:
+        raise ValidationError(_('The last week is before the first week.'))
+    if utils.orders_closed(weeks[0]):
+        raise ValidationError(_('The orders of the first week are already '
+                                'closed.'))
+    user = User.objects.select_related('weeklybasket').get(pk=user.pk)
+    weekly = Counter()
+    prices = {}
+    if user.is_member and user.weeklybasket is not None:
+        for (portion, price) in user.weeklybasket.contents.values_list(
+                'pk', 'price'):
+            weekly[portion] += 1
+            prices[portion] = price
+
+    with transaction.atomic():
+        baskets = OrderBasket.objects.filter(user=user, week__in=weeks)
+        # Takes the write lock on SQLite before anything is read, see
+        # OrderBasketQuerySet.lock.
+        baskets.update(edited_weekly_basket=F('edited_weekly_basket'))
+        existing = dict(baskets.select_for_update().values_list(
+            'week', 'edited_weekly_basket'))
+        ordered = {week: Counter() for week in weeks}
+        for (week, portion, count) in OrderBasketProduct.objects.filter(
+                basket__in=baskets).values_list('basket__week', 'portion',
+                                                'count'):
+            ordered[week][portion] += count
+
+        credits = {}
+        for week in weeks:
+            kept = weekly & ordered[week] if existing.get(week) else weekly
+            credits[week] = int(round(sum(prices[portion] * count
+                                          for portion, count
+                                          in kept.items())))
+
+        delete_line_items(OrderBasketProduct.objects.filter(
+            basket__in=baskets))
+        baskets.update(edited_weekly_basket=True)
+        OrderBasket.objects.bulk_create([
+            OrderBasket(user=user, week=week, edited_weekly_basket=True)
+            for week in weeks if week not in existing])
+
+        entries = []
+        for week, amount in credits.items():
+            if amount:
+                year, number = utils.year_week(week)
+                entries.append(AccountEntry(user=user, year=year,
+                                            week=number, amount=amount))
+        if entries:
+            AccountEntry.objects.bulk_create(entries)
+            User.objects.filter(pk=user.pk).update(
+                assets=F('assets') + sum(credits.values()))
+            caching.bump('members')
+        for week in weeks:
+            caching.bump('orders', user.pk, week)
+        caching.bump('totals')
+    return credits
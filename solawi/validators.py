@@ -4,8 +4,57 @@ from django.utils.translation import ugettext_lazy as _
 import json
 
 
+def validate_year(value):
+    '''
+
+    Args:
+      value: 
+
+    Returns:
+
+    '''
+    if not isinstance(value, int) or \
+            not datetime.MINYEAR <= value <= datetime.MAXYEAR:
+        raise ValidationError(
+            _('{y} is not a year number.').format(y=value),
+            params={'value': value},)
+
+
+def validate_week(value):
+    '''
+
+    Args:
+      value: 
+
+    Returns:
+
+    '''
+    if not isinstance(value, int) or value > 53 or value < 0:
+        raise ValidationError(
+            _('{w} is not a week number.').format(w=value),
+            params={'value': value},)
+
+
+def validate_asset(value):
+    '''
+
+    Args:
+      value: 
+
+    Returns:
+
+    '''
+    if not isinstance(value, int) or value < 0:
+        raise ValidationError(
+            _('{v} is not a valid asset').format(v=value),
+            params={'value': value},)
+
+
 def portion_account_validate(value):
     '''
+    Validate the former JSON account of a user. Only kept because the
+    initial migration references it, the migration into AccountEntry rows
+    reads the JSON column itself.
 
     Args:
       value: 
@@ -32,15 +81,6 @@ def portion_account_validate(value):
                       ' [year, week, assets].').format(i=i),
                     params={'value': value},)
             (year, week, asset) = i
-            if not isinstance(year, int) or year < datetime.MINYEAR or year > datetime.MAXYEAR:
-                raise ValidationError(
-                    _('{y} is not a year number.').format(y=year),
-                    params={'value': value},)
-            if not isinstance(week, int) or week > 53 or week < 0:
-                raise ValidationError(
-                    _('{w} is not a week number.').format(w=week),
-                    params={'value': value},)
-            if not isinstance(asset, int) or asset < 0:
-                raise ValidationError(
-                    _('{v} is not a valid asset').format(v=asset),
-                    params={'value': value},)
+            validate_year(year)
+            validate_week(week)
+            validate_asset(asset)
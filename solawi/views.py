@@ -1,15 +1,35 @@
+from collections import Counter, OrderedDict
 import datetime
+import hashlib
+import time
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.core import signing
+from django.core.exceptions import PermissionDenied
+from django.db import connection
+from django.db.models import Prefetch, Q, prefetch_related_objects
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import (
     get_list_or_404,
     get_object_or_404,
     render,
     )
+from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.utils.functional import cached_property
 from django.views import generic
+from django.views.decorators.http import condition
+from solawi import caching
+from solawi import exports
 from solawi import forms
+from solawi import profiling
+from solawi import projection
+from solawi import reports
+from solawi.baskets import BasketDiff, apply_standing_orders
 from solawi.models import (
+    BasketSnapshot,
+    ClosedWeek,
     Depot,
     OrderBasket,
     OrderBasketProduct,
@@ -17,8 +37,11 @@ from solawi.models import (
     Product,
     User,
     WeeklyBasket,
+    run_in_transaction,
+    standing_order_changes,
     )
 from solawi import utils
+from solawi import vacation
 from solawi.utils import view_property
 
 
@@ -29,20 +52,142 @@ class BaseMemberView(generic.TemplateView):
 
     @view_property
     def user(self):
-        ''' '''
-        return self.request.user
+        '''
+        The user of the request, loaded once with its depot and weekly
+        basket, which the header, the forms and the fragments of the page
+        share.
+        '''
+        return User.objects.select_related('depot', 'weeklybasket').get(
+            pk=self.request.user.pk)
 
     @view_property
     def controls(self):
         ''' '''
         controls = {
-            'depot': '/depot/{depot}/'.format(depot=self.user.depot.id)
+            'depot': '/depot/{depot}/'.format(depot=self.user.depot.id),
+            'vacation': '/urlaub/',
             }
         return controls
 
+    @view_property
+    def fragment_timeout(self):
+        ''' '''
+        return settings.FRAGMENT_CACHE_TIMEOUT
+
+
+class WeekMixin(object):
+    '''
+    A view on the week given by the year and week in the URL, by default
+    the current week.
+    '''
+
+    @view_property
+    def week_start(self):
+        ''' '''
+        year = self.kwargs.get('year', None)
+        week = self.kwargs.get('week', None)
+        try:
+            return utils.date_from_week(year, week)
+        except ValueError:
+            raise Http404
+
+    @view_property
+    def week_end(self):
+        ''' '''
+        return self.week_start + datetime.timedelta(6)
+
+
+class BasketMixin(WeekMixin):
+    '''
+    The order basket and the weekly basket of the user in the week.
+    '''
+
+    @view_property
+    def closed(self):
+        '''
+        If the orders of this week are closed, without a query.
+        '''
+        return utils.orders_closed(self.week_start)
+
+    @view_property
+    def closed_week(self):
+        '''
+        The ClosedWeek with the frozen basket of the user as member_basket,
+        or None if the week is not closed or has no snapshot yet.
+        '''
+        if not self.closed:
+            return None
+        return ClosedWeek.objects.filter(
+            week=self.week_start).prefetch_related(
+                Prefetch('baskets',
+                         queryset=BasketSnapshot.objects.filter(
+                             user=self.user).select_related('product'),
+                         to_attr='member_basket')).first()
+
+    @view_property
+    def orders(self):
+        '''
+        The order basket of this week. If the user has none yet, an unsaved
+        basket derived from the weekly basket is returned, which is only
+        saved when it gets modified.
+        '''
+        orders = self.user.orders.filter(
+            week=self.week_start).prefetch_related(
+                Prefetch('orderbasketproduct_set',
+                         queryset=OrderBasketProduct.objects.select_related(
+                             'portion__food'))).first()
+        if orders is None:
+            orders = OrderBasket(week=self.week_start, user=self.user)
+        return orders
+
+    @view_property
+    def weekly_basket(self):
+        '''
+        The weekly basket of the user with its portions and their products.
+        '''
+        weekly_basket = self.user.weeklybasket
+        if weekly_basket is not None:
+            prefetch_related_objects(
+                [weekly_basket],
+                Prefetch('contents',
+                         queryset=Portion.objects.select_related('food')))
+        return weekly_basket
+
+    @view_property
+    def standing_changes(self):
+        '''
+        The changes of the standing orders of the user in this week, if the
+        user has no order basket yet. Otherwise they were applied when the
+        basket was created.
+        '''
+        if self.orders.pk is not None:
+            return []
+        basket = self.user.weeklybasket_id if self.user.is_member else None
+        changes, users = standing_order_changes(self.week_start,
+                                                {self.user.pk: basket})
+        return changes.get(self.user.pk, [])
+
+    @view_property
+    def basket_diff(self):
+        '''
+        For a week without an order basket, the basket the standing orders
+        will create is computed without writing it.
+        '''
+        if not self.standing_changes:
+            return BasketDiff.from_baskets(self.orders, self.weekly_basket)
+        weekly = []
+        if self.user.is_member and self.weekly_basket is not None:
+            weekly = list(self.weekly_basket.contents.all())
+        edited, lines = apply_standing_orders(
+            Counter(portion.pk for portion in weekly), self.standing_changes)
+        portions = Portion.objects.select_related('food').in_bulk(list(lines))
+        self.orders.edited_weekly_basket = edited
+        return BasketDiff(weekly, [(portions[pk], count)
+                                   for pk, count in lines.items()], edited)
+
 
 @method_decorator(login_required, name='dispatch')
-class WeekView(BaseMemberView):
+class WeekView(BasketMixin, BaseMemberView):
     ''' '''
     template_name = 'week.html'
 
@@ -57,87 +202,155 @@ class WeekView(BaseMemberView):
         Returns:
 
         '''
-        weekly_basket_form = forms.WeeklyBasketForm(
-            data=request.POST, orderbasket=self.orders,
-            weeklybasket=self.user.weeklybasket)
+        if self.closed:
+            raise PermissionDenied
+        diff = self.basket_diff
+        weekly_basket_form = forms.WeeklyBasketForm(diff, data=request.POST)
         if weekly_basket_form.is_valid():
-            print(weekly_basket_form.__dict__)
-            # weekly_basket_form.save()
+            selected = weekly_basket_form.cleaned_data.get('contents')
+            run_in_transaction(lambda: self.edit_weekly_basket(selected))
 
         order_basket_form = forms.OrderBasketForm(
-            request.POST, instance=self.orders)
+            request.POST, instance=self.orders, diff=diff,
+            portions=self.portions_list)
         if order_basket_form.is_valid():
-            print('is valide')
-            # order_basket_form.save()
-            order_basket_mod = order_basket_form.save(commit=False)
-            order_basket_mod.save()
-            # OrderBasketProduct.objects.filter(basket=order_basket_mod).delete()
-            for portion in order_basket_form.cleaned_data.get('contents'):
-                order_basket_product = OrderBasketProduct.objects.filter(basket=order_basket_mod)
-                if order_basket_product:
-                    order_basket_product = order_basket_product[0]
-                    order_basket_product.count += 1
-                else:
-                    order_basket_product = OrderBasketProduct(
-                        basket=order_basket_mod, portion=portion, count=1)
-                order_basket_product.save()
+            counts = Counter(portion.pk for portion
+                             in order_basket_form.cleaned_data.get('contents'))
+            run_in_transaction(lambda: OrderBasket.objects.lock(
+                self.user, self.week_start).add_portions(counts))
+        utils.reset_view_properties(self, 'orders', 'basket_diff',
+                                    'ordered_portions')
         return self.get(request, *args, **kwargs)
 
-    @view_property
-    def week_start(self):
-        ''' '''
-        year = self.kwargs.get('year', None)
-        week = self.kwargs.get('week', None)
-        return utils.date_from_week(year, week)
+    def edit_weekly_basket(self, selected):
+        '''
+        Keep only the selected portions of the weekly basket. The diff is
+        computed again from the locked basket, so a concurrent post can not
+        get lost.
 
-    @view_property
-    def week_end(self):
-        ''' '''
-        return self.week_start + datetime.timedelta(6)
+        Args:
+          selected: The ids of the weekly basket portions to keep.
+
+        Returns:
+
+        '''
+        orders = OrderBasket.objects.lock(self.user, self.week_start)
+        diff = BasketDiff.from_baskets(orders, self.weekly_basket)
+        orders.edited_weekly_basket = bool(diff.weekly - Counter(selected))
+        orders.save(update_fields=['edited_weekly_basket'])
+        orders.set_portions(diff.with_selection(selected)
+                            if orders.edited_weekly_basket else diff.added)
 
     @view_property
     def portions_list(self):
-        ''' '''
-        return Portion.objects.order_by('-quantity')
+        '''
+        The catalogue, shared by its fragment and the order basket form.
+        '''
+        return list(Portion.objects.select_related('food').order_by(
+            '-quantity'))
 
     @view_property
-    def orders(self):
+    def versions(self):
+        '''
+        The versions of the data the cached fragments of this page show.
+        '''
+        return caching.versions(('catalogue',), ('weeklybaskets',),
+                                ('orders', self.user.pk, self.week_start),
+                                ('standing',))
+
+    @view_property
+    def ordered_portions(self):
         ''' '''
-        orders = self.user.orders.filter(week=self.week_start)
-        if orders:
-            return orders[0]
-        else:
-            orders = OrderBasket(week=self.week_start, user=self.user)
-            orders.save()
-            return orders
+        if self.orders.pk is None:
+            return [portion for portion, count
+                    in self.basket_diff.items(self.basket_diff.ordered)]
+        return [line.portion
+                for line in self.orders.orderbasketproduct_set.all()]
 
     @view_property
     def weekly_basket_form(self):
         ''' '''
-        # if self.user.weeklybasket:
-            # return forms.WeeklyBasketForm(instance=self.user.weeklybasket)
-        return forms.WeeklyBasketForm(orderbasket=self.orders,
-                                      weeklybasket=self.user.weeklybasket)
+        if self.closed:
+            return None
+        return forms.WeeklyBasketForm(self.basket_diff)
 
     @view_property
     def order_basket_form(self):
         ''' '''
-        return forms.OrderBasketForm(instance=self.orders)
+        if self.closed:
+            return None
+        return forms.OrderBasketForm(instance=self.orders,
+                                     diff=self.basket_diff,
+                                     portions=self.portions_list)
 
     @view_property
     def controls(self):
         ''' '''
         controls = super().controls
         for name, multi in [('next_week', 1), ('prev_week', -1)]:
-            week = self.week_start + multi * datetime.timedelta(7)
-            controls[name] = week.strftime('/woche/%Y/%W')
+            year, week = utils.year_week(
+                self.week_start + multi * datetime.timedelta(7))
+            controls[name] = '/woche/{year}/{week:02d}/'.format(year=year,
+                                                                week=week)
         return controls
 
 
+@method_decorator(login_required, name='dispatch')
+class VacationView(BaseMemberView):
+    '''
+    Cancel the baskets of the user for a range of weeks.
+    '''
+    template_name = 'vacation.html'
+    # The list of (Monday, credited amount) of the weeks cancelled by the
+    # post.
+    cancelled = None
+
+    def post(self, request, *args, **kwargs):
+        '''
+
+        Args:
+          request:
+          *args:
+          **kwargs:
+
+        Returns:
+
+        '''
+        if self.form.is_valid():
+            credits = run_in_transaction(lambda: vacation.cancel_weeks(
+                self.user, self.form.cleaned_data['first'],
+                self.form.cleaned_data['last']))
+            self.cancelled = sorted(credits.items())
+            self.user.refresh_from_db(fields=['assets'])
+        return self.get(request, *args, **kwargs)
+
+    @view_property
+    def form(self):
+        ''' '''
+        if self.request.method == 'POST':
+            return forms.VacationForm(data=self.request.POST)
+        return forms.VacationForm()
+
+
 @method_decorator(login_required, name='dispatch')
 class DepotView(BaseMemberView):
-    ''' '''
+    '''
+    The members of a depot with the state of their basket in the current
+    week, a page at a time. The page is read with one query, sorted and
+    filtered by the database and continued after the last member shown
+    instead of at an offset.
+    '''
     template_name = 'depot.html'
+    # The columns the members can be sorted by, the id breaks ties. The
+    # keyset conditions compare false against NULL, so the nullable assets
+    # are sorted as assets_or_zero.
+    sorts = OrderedDict([
+        ('name', ['last_name', 'first_name']),
+        ('assets', ['assets_or_zero']),
+        ('items', ['item_count']),
+        ('total', ['total_price']),
+    ])
+    statuses = ['weekly', 'ordered', 'edited']
 
     @view_property
     def depot(self):
@@ -145,7 +358,620 @@ class DepotView(BaseMemberView):
         self.depot_id = self.kwargs.get('depot_id', None)
         return get_object_or_404(Depot, id=self.depot_id)
 
+    @view_property
+    def sort(self):
+        '''
+        The sort column and if it is descending, from the sort parameter,
+        e.g. -items.
+        '''
+        sort = self.request.GET.get('sort', 'name')
+        descending = sort.startswith('-')
+        sort = sort.lstrip('-')
+        if sort not in self.sorts:
+            return 'name', False
+        return sort, descending
+
+    @view_property
+    def status(self):
+        '''
+        Only show members whose basket is this week's weekly basket,
+        ordered on top of it or edited.
+        '''
+        status = self.request.GET.get('status')
+        return status if status in self.statuses else None
+
+    @view_property
+    def search(self):
+        ''' '''
+        return self.request.GET.get('q', '').strip()
+
+    @view_property
+    def basket_state(self):
+        ''' '''
+        return reports.basket_state_sql(self.monday)
+
+    def key_sql(self, name):
+        '''
+
+        Args:
+          name: A sort column or id.
+
+        Returns:
+          The SQL of the column and its params.
+
+        '''
+        if name in self.basket_state:
+            return self.basket_state[name]
+        if name == 'assets_or_zero':
+            sql, params = self.key_sql('assets')
+            return 'COALESCE({sql}, 0)'.format(sql=sql), params
+        qn = connection.ops.quote_name
+        return '{table}.{column}'.format(
+            table=qn(User._meta.db_table),
+            column=qn(User._meta.get_field(name).column)), []
+
+    @view_property
+    def queryset(self):
+        '''
+        The filtered and sorted members of the depot with their basket
+        state.
+        '''
+        members = reports.with_basket_state(self.depot.members.all(),
+                                            self.monday)
+        assets, assets_params = self.key_sql('assets_or_zero')
+        members = members.extra(select={'assets_or_zero': assets},
+                                select_params=assets_params)
+        if self.request.GET.get('supervisors'):
+            members = members.filter(is_supervisor=True)
+        if self.search:
+            members = members.filter(
+                Q(first_name__icontains=self.search) |
+                Q(last_name__icontains=self.search) |
+                Q(username__icontains=self.search))
+        if self.status is not None:
+            has_basket, has_basket_params = self.basket_state['has_basket']
+            edited, edited_params = self.basket_state['edited']
+            where = {
+                'weekly': '{has_basket} = 0',
+                'ordered': '{has_basket} = 1 AND {edited} = 0',
+                'edited': '{edited} = 1',
+            }[self.status].format(has_basket=has_basket, edited=edited)
+            params = {
+                'weekly': has_basket_params,
+                'ordered': has_basket_params + edited_params,
+                'edited': edited_params,
+            }[self.status]
+            members = members.extra(where=[where], params=params)
+        sort, descending = self.sort
+        return members.order_by(*[('-' if descending else '') + key
+                                  for key in self.sort_keys])
+
+    @view_property
+    def sort_keys(self):
+        ''' '''
+        return self.sorts[self.sort[0]] + ['id']
+
+    @view_property
+    def page(self):
+        '''
+        The members of the page plus the first member of the next one.
+        '''
+        members = self.queryset
+        try:
+            after = signing.loads(self.request.GET['after'])
+        except (KeyError, signing.BadSignature):
+            after = None
+        if after is not None and len(after) == len(self.sort_keys):
+            where, params = utils.keyset_condition(
+                [self.key_sql(key) for key in self.sort_keys], after,
+                self.sort[1])
+            members = members.extra(where=[where], params=params)
+        return list(members[:settings.DEPOT_PAGE_SIZE + 1])
+
     @view_property
     def members(self):
+        '''
+        The members of the page with their projected account as projection.
+        '''
+        members = self.page[:settings.DEPOT_PAGE_SIZE]
+        projections = projection.project_balances(
+            User.objects.filter(pk__in=[member.pk for member in members]))
+        for member in members:
+            member.projection = projections[member.pk]
+        return members
+
+    def url(self, **params):
+        '''
+
+        Args:
+          **params: The parameters to change, None drops one.
+
+        Returns:
+          The query string of this page with the changed parameters,
+          starting at the first page unless after is given.
+
+        '''
+        query = self.request.GET.copy()
+        query.pop('after', None)
+        for name, value in params.items():
+            query.pop(name, None)
+            if value is not None:
+                query[name] = value
+        return '?' + query.urlencode()
+
+    @view_property
+    def next_page(self):
+        ''' '''
+        if len(self.page) <= settings.DEPOT_PAGE_SIZE:
+            return None
+        last = self.page[settings.DEPOT_PAGE_SIZE - 1]
+        return self.url(after=signing.dumps(
+            [getattr(last, key) for key in self.sort_keys]))
+
+    @view_property
+    def sort_links(self):
+        '''
+        The URLs sorting by each column, descending if it already is sorted
+        ascending by it.
+        '''
+        sort, descending = self.sort
+        return {name: self.url(sort=('-' if name == sort and not descending
+                                     else '') + name)
+                for name in self.sorts}
+
+    @view_property
+    def status_links(self):
+        ''' '''
+        return [(status, self.url(status=status))
+                for status in self.statuses] + [(None, self.url(status=None))]
+
+    @view_property
+    def monday(self):
+        '''
+        The projections and basket states change with the week.
+        '''
+        return utils.get_moday()
+
+    @view_property
+    def versions(self):
         ''' '''
-        return self.depot.members.all()
+        return caching.versions(('members',), ('weeklybaskets',),
+                                ('catalogue',), ('standing',), ('totals',))
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class TotalsView(WeekMixin, generic.TemplateView):
+    '''
+    The products ordered in a week per depot, read from the weekly totals
+    while the orders are open.
+    '''
+    template_name = 'totals.html'
+
+    @view_property
+    def pivot(self):
+        ''' '''
+        return reports.week_pivot(self.week_start)
+
+    @view_property
+    def column_labels(self):
+        ''' '''
+        return [self.pivot.column_labels[column]
+                for column in self.pivot.columns]
+
+    @view_property
+    def export(self):
+        ''' '''
+        year, week = utils.year_week(self.week_start)
+        return '/export/{year}/{week:02d}/'.format(year=year, week=week)
+
+
+@method_decorator(login_required, name='dispatch')
+class PackingListExportView(WeekMixin, BaseMemberView):
+    '''
+    The packing list of a depot as CSV, for the supervisors of the depot
+    and the staff.
+    '''
+
+    @view_property
+    def depot(self):
+        ''' '''
+        return get_object_or_404(Depot, id=self.kwargs.get('depot_id'))
+
+    def get(self, request, *args, **kwargs):
+        '''
+
+        Args:
+          request:
+          *args:
+          **kwargs:
+
+        Returns:
+
+        '''
+        if not (self.user.is_staff or (self.user.is_supervisor and
+                                       self.user.depot_id == self.depot.id)):
+            raise PermissionDenied
+        return exports.stream_csv(
+            exports.packing_list_rows(self.depot, self.week_start),
+            exports.week_filename(
+                'packing-list-{pk}'.format(pk=self.depot.pk),
+                self.week_start))
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class TotalsExportView(WeekMixin, generic.View):
+    '''
+    The totals of all depots in a week as CSV.
+    '''
+
+    def get(self, request, *args, **kwargs):
+        '''
+
+        Args:
+          request:
+          *args:
+          **kwargs:
+
+        Returns:
+
+        '''
+        return exports.stream_csv(
+            exports.totals_rows(self.week_start),
+            exports.week_filename('totals', self.week_start))
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class HistoryExportView(WeekMixin, generic.View):
+    '''
+    All line items of the given number of weeks up to a week as CSV.
+    '''
+
+    def get(self, request, *args, **kwargs):
+        '''
+
+        Args:
+          request:
+          *args:
+          **kwargs:
+
+        Returns:
+
+        '''
+        weeks = int(self.kwargs.get('weeks'))
+        first_week = self.week_start - datetime.timedelta(7 * (weeks - 1))
+        return exports.stream_csv(
+            exports.history_rows(first_week, self.week_start),
+            exports.week_filename('history-{weeks}'.format(weeks=weeks),
+                                  self.week_start))
+
+
+class JSONView(generic.View):
+    '''
+    Read only rows as compact JSON: {"fields": [...], "rows": [[...], ...]}.
+    The fields can be selected with ?fields=a,b. The ETag and Last-Modified
+    are derived from the cache versions of the shown data, so a client
+    with an unchanged copy gets a 304 without a single query for the rows.
+    '''
+    fields = []
+
+    @view_property
+    def user(self):
+        ''' '''
+        return self.request.user
+
+    @view_property
+    def selected_fields(self):
+        '''
+        The requested fields, or None if an unknown one was requested.
+        '''
+        fields = self.request.GET.get('fields')
+        if not fields:
+            return list(self.fields)
+        fields = fields.split(',')
+        if not set(fields) <= set(self.fields):
+            return None
+        return fields
+
+    def get_versions(self):
+        '''
+
+        Returns:
+          A dict of the versions of all data in the response.
+
+        '''
+        raise NotImplementedError
+
+    def get_rows(self, fields):
+        '''
+
+        Args:
+          fields: The selected fields.
+
+        Returns:
+          An iterable of the rows with the values of the fields.
+
+        '''
+        raise NotImplementedError
+
+    @view_property
+    def versions(self):
+        ''' '''
+        return self.get_versions()
+
+    @view_property
+    def etag(self):
+        ''' '''
+        key = repr((sorted(self.versions.items()), self.user.pk,
+                    self.request.get_full_path()))
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def get_modified(self):
+        '''
+
+        Returns:
+          The seconds since the epoch of the last change of the data. The
+          versions are the microseconds since the epoch of their last bump.
+
+        '''
+        return max(self.versions.values()) / 1000000
+
+    @view_property
+    def last_modified(self):
+        '''
+        Last-Modified only has whole seconds, so it is left out until the
+        second of the last change has passed. A later change then always
+        gets a later Last-Modified.
+        '''
+        second = int(self.get_modified())
+        if time.time() < second + 1:
+            return None
+        return datetime.datetime.fromtimestamp(second, timezone.utc)
+
+    def get(self, request, *args, **kwargs):
+        '''
+
+        Args:
+          request:
+          *args:
+          **kwargs:
+
+        Returns:
+
+        '''
+        if self.selected_fields is None:
+            return JsonResponse(
+                {'error': 'Unknown field. Known fields: {fields}'.format(
+                    fields=','.join(self.fields))}, status=400)
+        return condition(
+            etag_func=lambda request, *args, **kwargs: self.etag,
+            last_modified_func=lambda request, *args, **kwargs:
+            self.last_modified)(self.render_rows)(request, *args, **kwargs)
+
+    def render_rows(self, request, *args, **kwargs):
+        ''' '''
+        return JsonResponse({
+            'fields': self.selected_fields,
+            'rows': list(self.get_rows(self.selected_fields)),
+        })
+
+
+def pick(row, fields, all_fields):
+    '''
+
+    Args:
+      row: The values of all fields.
+      fields: The selected fields.
+      all_fields: The names of all fields.
+
+    Returns:
+      The values of the selected fields.
+
+    '''
+    return [row[all_fields.index(field)] for field in fields]
+
+
+@method_decorator(login_required, name='dispatch')
+class BasketJSONView(BasketMixin, JSONView):
+    '''
+    The portions the user gets in the week.
+    '''
+    fields = ['portion', 'product', 'quantity', 'unit', 'count', 'price']
+
+    def get_versions(self):
+        ''' '''
+        return caching.versions(('catalogue',), ('weeklybaskets',),
+                                ('orders', self.user.pk, self.week_start),
+                                ('standing',), ('closed_weeks',),
+                                ('members',))
+
+    @view_property
+    def etag(self):
+        '''
+        The weekly basket of the user and the order cutoff change the basket
+        without a version bump.
+        '''
+        key = (super().etag, self.user.weeklybasket_id, self.closed)
+        return hashlib.md5(repr(key).encode()).hexdigest()
+
+    def get_modified(self):
+        '''
+        A new weekly basket of the user bumps the members, the order cutoff
+        bumps nothing.
+        '''
+        modified = super().get_modified()
+        if self.closed:
+            modified = max(modified,
+                           utils.order_cutoff(self.week_start).timestamp())
+        return modified
+
+    def get_rows(self, fields):
+        ''' '''
+        if self.closed_week is not None:
+            for item in self.closed_week.member_basket:
+                yield pick([item.portion_id, item.product.name, item.quantity,
+                            item.product.unit, item.count, item.price],
+                           fields, self.fields)
+            return
+        diff = self.basket_diff
+        for portion, count in diff.items(diff.effective()):
+            yield pick([portion.pk, portion.food.name, portion.quantity,
+                        portion.food.unit, count, portion.price],
+                       fields, self.fields)
+
+
+@method_decorator(login_required, name='dispatch')
+class CatalogueJSONView(JSONView):
+    '''
+    All portions that can be ordered.
+    '''
+    fields = ['portion', 'product', 'quantity', 'unit', 'price']
+    lookups = {
+        'portion': 'pk',
+        'product': 'food__name',
+        'quantity': 'quantity',
+        'unit': 'food__unit',
+        'price': 'price',
+    }
+
+    def get_versions(self):
+        ''' '''
+        return caching.versions(('catalogue',))
+
+    def get_rows(self, fields):
+        ''' '''
+        return Portion.objects.order_by('food__name', 'quantity').values_list(
+            *[self.lookups[field] for field in fields])
+
+
+@method_decorator(login_required, name='dispatch')
+class DepotJSONView(JSONView):
+    '''
+    The members of a depot with their assets.
+    '''
+    fields = ['member', 'first_name', 'last_name', 'assets', 'is_supervisor']
+    lookups = {
+        'member': 'pk',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'assets': 'assets',
+        'is_supervisor': 'is_supervisor',
+    }
+
+    def get(self, request, *args, **kwargs):
+        '''
+        The depot is looked up before the conditional response, so an
+        unknown depot is a 404 even for a client sending a matching ETag.
+
+        Args:
+          request:
+          *args:
+          **kwargs:
+
+        Returns:
+
+        '''
+        self.depot = get_object_or_404(Depot, id=kwargs.get('depot_id'))
+        return super().get(request, *args, **kwargs)
+
+    def get_versions(self):
+        ''' '''
+        return caching.versions(('members',))
+
+    def get_rows(self, fields):
+        ''' '''
+        return self.depot.members.order_by(
+            'last_name', 'first_name').values_list(
+                *[self.lookups[field] for field in fields])
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class TotalsJSONView(WeekMixin, JSONView):
+    '''
+    The quantities of the products per depot in the week.
+    '''
+    fields = ['product', 'depot', 'quantity']
+
+    def get_versions(self):
+        ''' '''
+        return caching.versions(('totals',), ('weeklybaskets',),
+                                ('members',), ('catalogue',),
+                                ('closed_weeks',))
+
+    @view_property
+    def etag(self):
+        ''' '''
+        key = (super().etag, utils.orders_closed(self.week_start))
+        return hashlib.md5(repr(key).encode()).hexdigest()
+
+    def get_modified(self):
+        ''' '''
+        modified = super().get_modified()
+        if utils.orders_closed(self.week_start):
+            modified = max(modified,
+                           utils.order_cutoff(self.week_start).timestamp())
+        return modified
+
+    def get_rows(self, fields):
+        ''' '''
+        pivot = reports.week_pivot(self.week_start)
+        for row in pivot.rows:
+            for column in pivot.columns:
+                quantity = pivot[row, column]
+                if quantity:
+                    yield pick([pivot.row_labels[row],
+                                pivot.column_labels[column], quantity],
+                               fields, self.fields)
+
+
+@method_decorator(login_required, name='dispatch')
+class VacationJSONView(generic.View):
+    '''
+    Cancel the baskets of the user for the weeks from first to last, given
+    as ISO dates in the post.
+    '''
+
+    def post(self, request, *args, **kwargs):
+        '''
+
+        Args:
+          request:
+          *args:
+          **kwargs:
+
+        Returns:
+
+        '''
+        form = forms.VacationForm(data=request.POST)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+        credits = run_in_transaction(lambda: vacation.cancel_weeks(
+            request.user, form.cleaned_data['first'],
+            form.cleaned_data['last']))
+        return JsonResponse({
+            'fields': ['year', 'week', 'credit'],
+            'rows': [list(utils.year_week(monday)) + [credit]
+                     for monday, credit in sorted(credits.items())],
+        })
+
+
+class MetricsView(generic.View):
+    '''
+    The request histograms of this process in the Prometheus text format,
+    for the addresses in METRICS_ALLOWED_IPS.
+    '''
+
+    def get(self, request, *args, **kwargs):
+        '''
+
+        Args:
+          request:
+          *args:
+          **kwargs:
+
+        Returns:
+
+        '''
+        if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+            raise PermissionDenied
+        return HttpResponse(profiling.metrics_text(),
+                            content_type='text/plain; version=0.0.4')